@@ -1,46 +1,80 @@
+import time
+startup_time = time.perf_counter() # before other imports, so time of imports is measured
+import argparse
 import pygame
 import pygame.freetype
-import time
+import history
 import gamemodes
+from profiler import frame_profiler, startup_profiler
+from sounds import load_sounds
+from sprites import text_cache
+from fonts import get_font, preload_fonts
+from events import EventDispatcher
+from recording import session_recorder
+from telemetry import shot_telemetry
+from sketches import TDigest
 from pygame.constants import USEREVENT
-from config import SETTINGS
+from config import SETTINGS, settings_store
 
 from pygame.locals import (
     QUIT,
     KEYDOWN,
+    MOUSEBUTTONDOWN,
     K_s,
     K_r,
-    K_ESCAPE
+    K_d,
+    K_p,
+    K_t,
+    K_f,
+    K_ESCAPE,
+    VIDEORESIZE,
+    VIDEOEXPOSE
 )
 
 
+# Times are measured with monotonic time.perf_counter()
 class ScoreCounter():
-    def __init__(self):
+    def __init__(self, screen):
+        self.screen = screen
         self.hits = 0
         self.all_targets = 0
-        self.font_size = 30
-        self.font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.font_size)
+        self.font_size = SETTINGS.Appearance.score_fontsize
+        self.font = get_font(self.font_size)
         self.shoots = 0
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
         self.end_time = None
         self.last_hit_time = None
-        self.reaction_times = []
+        self.hud_text = None
+        self.hud_surface = None
+        self.reaction_times = TDigest() # between consecutive hits
+        self.spawn_reaction_times = TDigest() # from showing target to hitting it
+        self.timing_errors = TDigest() # how much earlier than measured each hit could happen
     
+    # render counter again only if its value changed
     def update(self):
         text = f"{self.hits}/{self.all_targets}"
-        text_rect = self.font.get_rect(text, size=30) 
-        text_rect.midtop = screen.get_rect().midtop
-        self.font.render_to(screen, text_rect, text, SETTINGS.Appearance.score_color)
+        if text != self.hud_text:
+            self.hud_text = text
+            self.hud_surface = text_cache.get(self.font, text, SETTINGS.Appearance.score_color, self.font_size)
+        text_rect = self.hud_surface.get_rect(midtop=self.screen.get_rect().midtop)
+        return self.screen.blit(self.hud_surface, text_rect)
 
-    def add_hit(self):
+    # click_time - when click was taken from event queue, shown_time - when hit target appeared on display,
+    # timing_error - time between taking events from queue (click happened somewhere in this period)
+    def add_hit(self, click_time=None, shown_time=None, timing_error=0):
         self.hits += 1
+        if click_time is None:
+            click_time = time.perf_counter()
         if self.last_hit_time:
-            reaction = time.time()-self.last_hit_time
-            self.reaction_times.append(reaction) 
-        self.last_hit_time = time.time()
+            reaction = click_time-self.last_hit_time
+            self.reaction_times.add(reaction)
+        self.last_hit_time = click_time
+        if shown_time is not None:
+            self.spawn_reaction_times.add(click_time-shown_time)
+        self.timing_errors.add(timing_error)
     
-    def add_target(self):
-        self.all_targets += 1
+    def add_target(self, amount=1):
+        self.all_targets += amount
 
     def add_shoot(self):
         self.shoots += 1
@@ -48,7 +82,7 @@ class ScoreCounter():
     # return how much time current round takes
     def get_time(self):
         if not self.end_time:
-            self.end_time = time.time()
+            self.end_time = time.perf_counter()
         return round(self.end_time - self.start_time, 2)
     
     def get_accuracy(self):
@@ -64,38 +98,112 @@ class ScoreCounter():
         return self.all_targets
     
     def get_median_reaction_time(self):
-        def median(data):
-            if len(data) == 0: return 0
-            data.sort()
-            mid = len(data) // 2
-            return (data[mid] + data[~mid]) / 2
-        return median(self.reaction_times)
+        return self.reaction_times.quantile(0.5)
+
+    def get_median_spawn_reaction_time(self):
+        return self.spawn_reaction_times.quantile(0.5)
+
+    # p50, p90, p99, mean and variance of reaction times
+    def get_reaction_time_stats(self):
+        return self.reaction_times.get_stats()
+
+    # sketches saved with results of round, merged in history
+    # rounds without hits have no reaction times to save
+    def get_sketches(self):
+        sketches = {
+            "Response": self.reaction_times,
+            "Spawn response": self.spawn_reaction_times
+        }
+        return {type: digest for type, digest in sketches.items() if digest.count}
+
+    # median of events queue polling intervals, reaction times could be shorter up to this value
+    def get_timing_error(self):
+        return self.timing_errors.quantile(0.5)
 
 
 class Game():
-    def __init__(self):
-        self.events = {}
+    def __init__(self, screen):
+        self.screen = screen
+        self.events = {
+            "ADD_TARGET": USEREVENT + 1,
+            "END_CHALLENGE": USEREVENT + 2
+        }
         self.challenge = False
         self.clock = pygame.time.Clock()
+        self.game_mode_classes = {
+            "Lobby": gamemodes.Lobby,
+            "Settings": gamemodes.Settings,
+            "Summary": gamemodes.Summary,
+            "Arcade": gamemodes.Arcade,
+            "Speedy fingers": gamemodes.SpeedyFingers,
+            "AWP": gamemodes.AWP,
+            "Swarm": gamemodes.Swarm
+        }
+        # game modes prepared in background while current one is running
+        self.next_game_modes = {
+            "Lobby": ["Arcade", "Speedy fingers", "AWP", "Swarm"],
+            "Arcade": ["Summary"],
+            "Speedy fingers": ["Summary"],
+            "AWP": ["Summary"],
+            "Swarm": ["Summary"]
+        }
+        self.game_mode_objs = {}
+        self.prewarm_queue = []
+        # work done after first frame is shown, one task per frame (history is read in background thread)
+        self.startup_tasks = [
+            ("fonts", preload_fonts),
+            ("sounds", load_sounds),
+            ("history thread start", history.load_history_in_background)
+        ]
+        self.running = True
+        self.event_dispatcher = EventDispatcher()
+        self.full_display_update = True
+        self.save_job = None # Future of saving last round, shown in summary
+        self.overlay_background = None # (surface, rect) of screen under profiler overlay
+        self.overlay_rect = None # overlay drawn or removed in current frame
+        self.event_dispatcher.set_allowed([QUIT, KEYDOWN, MOUSEBUTTONDOWN, VIDEORESIZE, VIDEOEXPOSE, *self.events.values()])
+        self.event_dispatcher.register(VIDEORESIZE, self.on_window_changed)
+        self.event_dispatcher.register(VIDEOEXPOSE, self.on_window_changed)
+        self.event_dispatcher.register(QUIT, self.on_quit)
+        self.event_dispatcher.register(KEYDOWN, self.on_key_down)
+        self.event_dispatcher.register(self.events["END_CHALLENGE"], self.on_end_challenge)
         self.change_game_mode("Lobby")
 
+    def get_game_mode_obj(self, game_mode):
+        if not game_mode in self.game_mode_objs:
+            if not game_mode in self.game_mode_classes:
+                raise Exception("There is no provided game mode: " + str(game_mode))
+            self.game_mode_objs[game_mode] = self.game_mode_classes[game_mode](self.screen, self)
+        return self.game_mode_objs[game_mode]
+
+    def get_game_mode_name(self, game_mode_obj):
+        for game_mode, obj in self.game_mode_objs.items():
+            if obj is game_mode_obj:
+                return game_mode
+
+    # game modes are created once and reset on every change
     def change_game_mode(self, game_mode):
-        if game_mode == "Lobby":
-            self.game_mode_obj = gamemodes.Lobby(screen, self)
-        elif game_mode == "Settings":
-            self.game_mode_obj = gamemodes.Settings(screen, self)
-        elif game_mode == "Summary":
-            self.game_mode_obj = gamemodes.Summary(screen, self)
-        elif game_mode == "Arcade":
-            self.game_mode_obj = gamemodes.Arcade(screen, self)
-        elif game_mode == "Speedy fingers":
-            self.game_mode_obj = gamemodes.SpeedyFingers(screen, self)
-        elif game_mode == "AWP":
-            self.game_mode_obj = gamemodes.AWP(screen, self)
-        else:
-            raise Exception("There is no provided game mode: " + str(game_mode))
+        settings_store.flush() # e.g. save settings changed on Settings screen
+        session_recorder.stop() # round of shooting mode ends
+        shot_telemetry.stop()
+        self.game_mode_obj = self.get_game_mode_obj(game_mode)
+        self.game_mode_obj.reset()
         self.game_mode_obj.load()
+        self.event_dispatcher.set_game_mode_handlers(self.game_mode_obj.get_event_handlers())
         self.game_mode = game_mode
+        self.prewarm_queue = list(self.next_game_modes.get(game_mode, []))
+
+    # prepare one of game modes likely to be used next, called in spare time after frame
+    def prewarm(self):
+        if self.startup_tasks:
+            startup_profiler.measure(*self.startup_tasks.pop(0))
+        elif self.prewarm_queue:
+            game_mode = self.prewarm_queue.pop(0)
+            startup_profiler.measure("prepare " + game_mode, self.get_game_mode_obj(game_mode).prepare)
+
+    # all startup tasks are done
+    def is_started(self):
+        return not self.startup_tasks and history.is_loaded()
     
     def set_challenge(self, is_challenge):
         self.challenge = is_challenge
@@ -103,55 +211,177 @@ class Game():
     def reset(self):
         for event in self.events.values():
             pygame.time.set_timer(event, 0) # doesnt work?
-        self.scoreCounter = ScoreCounter()
+        self.scoreCounter = ScoreCounter(self.screen)
+
+    # handle events of frame, returns False if game should be closed
+    def handle_events(self):
+        self.event_dispatcher.dispatch()
+        frame_profiler.mark("events")
+        return self.running
+
+    def on_quit(self, event):
+        self.running = False
+
+    def on_key_down(self, event):
+        # Go to summary
+        if event.key == K_s or event.key == K_ESCAPE and self.game_mode != "Lobby":
+            if self.game_mode != "Summary": # to prevent looping in summary
+                self.change_game_mode("Summary")
+        # Restart
+        elif event.key == K_r:
+            self.change_game_mode(self.game_mode)
+        # Switch rendering path
+        elif event.key == K_d:
+            self.toggle_dirty_rects()
+        # Frame timing overlay
+        elif event.key == K_p:
+            frame_profiler.toggle_overlay()
+        # Start or stop writing frame timings to file
+        elif event.key == K_t:
+            self.toggle_trace()
+        # Switch between window and fullscreen
+        elif event.key == K_f:
+            self.toggle_fullscreen()
+
+    # window is scaled again, so whole display has to be updated
+    def on_window_changed(self, event):
+        self.full_display_update = True
+
+    def on_end_challenge(self, event):
+        if self.game_mode != "Summary": # to prevent reloading summary
+            try:
+                self.save_job = self.game_mode_obj.save_results()
+            except AttributeError:
+                pass # save results method not implemented
+            self.change_game_mode("Summary")
     
-    def frame(self):
-        self.game_mode_obj.frame()
+    # frame_time - miliseconds simulated by shooting modes, measured with clock when None
+    def frame(self, frame_time=None):
+        self.game_mode_obj.frame(frame_time)
+        self.draw_overlay()
+
+    # screen under overlay is kept and put back after display update, so game modes which draw
+    # only changes (static screens, Swarm) don't lose what was covered by overlay
+    def draw_overlay(self):
+        if frame_profiler.overlay_visible:
+            overlay = frame_profiler.get_overlay()
+            overlay_rect = overlay.get_rect(topleft=(5, 5)).clip(self.screen.get_rect())
+            self.overlay_background = (self.screen.subsurface(overlay_rect).copy(), overlay_rect)
+            overlay_rect = self.screen.blit(overlay, overlay_rect)
+            # removed overlay could be bigger, e.g. with trace status
+            self.overlay_rect = overlay_rect.union(self.overlay_rect) if self.overlay_rect else overlay_rect
+            frame_profiler.mark("hud")
+
+    def remove_overlay(self):
+        if self.overlay_background is not None:
+            background, self.overlay_rect = self.overlay_background
+            self.screen.blit(background, self.overlay_rect)
+            self.overlay_background = None
+
+    def toggle_trace(self):
+        if frame_profiler.is_tracing():
+            frame_profiler.stop_trace() # path is shown in overlay
+        else:
+            frame_profiler.start_trace()
+
+    def update_display(self):
+        dirty_rects = self.get_dirty_rects()
+        if dirty_rects is None or self.full_display_update:
+            self.full_display_update = False
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
+        self.game_mode_obj.display_updated(time.perf_counter())
+        self.remove_overlay() # overlay stays on display until next update
+        frame_profiler.mark("display")
+
+    # returns rects changed in last frame or None if whole display should be updated
+    def get_dirty_rects(self):
+        dirty_rects = self.game_mode_obj.get_dirty_rects()
+        overlay_rect, self.overlay_rect = self.overlay_rect, None
+        if dirty_rects is not None and overlay_rect is not None:
+            dirty_rects = dirty_rects + [overlay_rect]
+        return dirty_rects
 
+    # switch between dirty rects and full screen rendering
+    def toggle_dirty_rects(self):
+        SETTINGS.DIRTY_RECTS = not SETTINGS.DIRTY_RECTS
 
-# PYGAME INIT
-pygame.init()
-screen = pygame.display.set_mode((SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT))
+    def toggle_fullscreen(self):
+        try:
+            pygame.display.toggle_fullscreen()
+        except pygame.error: # not supported by video driver
+            return
+        SETTINGS.Display.fullscreen = not SETTINGS.Display.fullscreen
+        SETTINGS.Display.save_settings()
+        self.full_display_update = True
 
-# LOAD GAME
-game = Game()
 
-# GAME EVENTS
-game.events["ADD_TARGET"] = USEREVENT + 1
-game.events["END_CHALLENGE"] = USEREVENT + 2
+# screen surface has logical size, SDL scales it to window or whole screen
+# and translates mouse positions back to logical coordinates
+def set_display_mode():
+    flags = pygame.SCALED
+    if SETTINGS.Display.fullscreen:
+        flags |= pygame.FULLSCREEN
+    else:
+        flags |= pygame.RESIZABLE
+    return pygame.display.set_mode((SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT), flags, vsync=SETTINGS.Display.vsync)
 
-# MAINLOOP
-running = True
-while running:
-    pygame.display.set_caption("FPS: " + str(int(game.clock.get_fps())))
-    for event in pygame.event.get((QUIT, KEYDOWN, game.events["END_CHALLENGE"])):
-        if event.type == QUIT:
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tool for improving your aim")
+    parser.add_argument("--profile-startup", action="store_true", help="print time of startup phases and exit")
+    args = parser.parse_args(argv)
+    startup_profiler.begin(startup_time)
+    startup_profiler.mark("imports")
+
+    # PYGAME INIT
+    # only modules needed for first frame, audio device is opened after it is shown
+    pygame.display.init()
+    pygame.freetype.init()
+    startup_profiler.mark("pygame init")
+    SETTINGS.load_saved_settings()
+    startup_profiler.mark("settings")
+    screen = set_display_mode()
+    startup_profiler.mark("display")
+
+    # LOAD GAME
+    game = Game(screen)
+    startup_profiler.mark("lobby")
+
+    # MAINLOOP
+    running = True
+    first_frame = True
+    while running:
+        frame_profiler.begin_frame()
+        pygame.display.set_caption("FPS: " + str(int(game.clock.get_fps())))
+        running = game.handle_events()
+        game.frame()
+        # refresh display
+        game.update_display()
+        if first_frame:
+            startup_profiler.mark("first frame")
+            first_frame = False
+        game.prewarm()
+        game.clock.tick(SETTINGS.FPS)
+        frame_profiler.mark("wait")
+        frame_profiler.end_frame()
+        if args.profile_startup and game.is_started() and not game.prewarm_queue:
+            startup_profiler.add("history (background)", history.load_time)
+            print(startup_profiler.report())
             running = False
-        elif event.type == KEYDOWN:
-            # Go to summary
-            if event.key == K_s or event.key == K_ESCAPE and game.game_mode != "Lobby":
-                # continue to prevent updating screen with targets after summary shows up
-                if game.game_mode != "Summary": # to prevent looping in summary
-                    game.change_game_mode("Summary")
-                    continue
-            # Restart
-            elif event.key == K_r:
-                game.change_game_mode(game.game_mode)
-                continue
-        elif event.type == game.events["END_CHALLENGE"]:
-            if game.game_mode != "Summary": # to prevent reloading summary
-                try:
-                    game.game_mode_obj.save_results()
-                except AttributeError:
-                    pass # save results method not implemented
-                game.change_game_mode("Summary")
-    game.frame()
-    # refresh display
-    pygame.display.update()
-    game.clock.tick(SETTINGS.FPS)
-
-pygame.quit()
+
+    if frame_profiler.is_tracing():
+        game.toggle_trace()
+    session_recorder.stop()
+    shot_telemetry.stop()
+    settings_store.flush()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
 
 
 # todo:
-# - add training modes
\ No newline at end of file
+# - add training modes
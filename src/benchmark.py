@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+
+# run without window and sound card, must be set before pygame is initialized
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from config import SETTINGS
+from aimbooster import Game
+from profiler import frame_profiler, percentile
+from fonts import preload_fonts
+from sounds import channel_pool, pre_init_mixer, load_sounds
+
+
+# Parameters swept for each game mode: {game mode: (settings name, {setting: values})}
+SWEEPS = {
+    "Arcade": ("Arcade", {"spawn_rate": [1, 5, 10], "max_radius": [10, 50, 100]}),
+    "Speedy fingers": ("SpeedyFingers", {"targets_amount": [1, 10, 25], "max_radius": [10, 50, 100]}),
+    "AWP": ("AWP", {"max_radius": [5, 10, 50]}),
+    "Swarm": ("Swarm", {"swarm_size": [1000, 3000, 5000], "max_radius": [1, 2, 3]}),
+    "Lobby": (None, {}),
+    "Summary": (None, {}),
+    "Settings": (None, {}),
+}
+
+
+def get_parameter_sets(sweep):
+    names = list(sweep)
+    for values in itertools.product(*(sweep[name] for name in names)):
+        yield dict(zip(names, values))
+
+# post scripted mouse events, in shooting modes some clicks are aimed at targets
+def post_input(game, rng, click_chance, aim_rate):
+    pos = (rng.randrange(SETTINGS.SCREEN_WIDTH), rng.randrange(SETTINGS.SCREEN_HEIGHT))
+    pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0)))
+    if rng.random() < click_chance:
+        targets = getattr(game.game_mode_obj, "targets", None)
+        if targets and rng.random() < aim_rate:
+            pos = targets.get_pos(rng.randrange(len(targets)))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1))
+
+def enter_game_mode(game, game_mode):
+    game.set_challenge(False) # challenge would save benchmark results to history
+    mode = game.get_game_mode_obj(game_mode)
+    if hasattr(mode, "get_spawn_positions"):
+        mode.get_spawn_positions() # wait for pool, so targets don't spawn without it while it is generated
+    if game_mode == "Summary":
+        game.change_game_mode("Arcade") # summary needs finished round
+    game.change_game_mode(game_mode)
+
+# run frames of one game mode, returns frame statistics. Every frame simulates 1000/fps miliseconds
+# of game (SETTINGS.FPS when uncapped), so targets spawn and disappear at same frames on every machine.
+def run_game_mode(game, game_mode, frames, rng, click_rate, aim_rate, fps):
+    pygame.event.clear()
+    enter_game_mode(game, game_mode)
+    frame_profiler.reset()
+    channel_pool.reset_stats()
+    frame_time = 1000/(fps or SETTINGS.FPS)
+    click_chance = click_rate*frame_time/1000
+    frame_times = []
+    transitions = 0
+    max_targets = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        post_input(game, rng, click_chance, aim_rate)
+        frame_start = time.perf_counter()
+        frame_profiler.begin_frame()
+        game.handle_events()
+        game.frame(frame_time)
+        game.update_display()
+        frame_times.append(time.perf_counter() - frame_start)
+        game.clock.tick(fps) # 0 means uncapped
+        frame_profiler.mark("wait")
+        frame_profiler.end_frame()
+        targets = getattr(game.game_mode_obj, "targets", None)
+        if game.game_mode == game_mode and targets is not None:
+            max_targets = max(max_targets, len(targets))
+        if game.game_mode != game_mode: # scripted click pressed button changing game mode
+            transitions += 1
+            enter_game_mode(game, game_mode)
+    elapsed = time.perf_counter() - start
+    # frames without targets would measure only empty screen
+    if hasattr(game.game_mode_obj, "targets") and max_targets == 0:
+        raise RuntimeError(f"no targets were spawned in {game_mode}")
+    frame_times.sort()
+    return {
+        "frames": frames,
+        "simulated_frame_ms": frame_time,
+        "max_targets": max_targets,
+        "mode_transitions": transitions,
+        "mean_ms": sum(frame_times)/len(frame_times)*1000,
+        "p50_ms": percentile(frame_times, 50)*1000,
+        "p95_ms": percentile(frame_times, 95)*1000,
+        "p99_ms": percentile(frame_times, 99)*1000,
+        "max_ms": frame_times[-1]*1000,
+        "frames_per_second": frames/elapsed,
+        "phases": {phase: stats for phase, stats in frame_profiler.get_stats().items() if phase != "frame"},
+        "audio_latency_ms": {name: stats for name, stats in channel_pool.latencies.get_stats().items() if name != "variance"},
+        "stolen_sounds": channel_pool.stolen,
+    }
+
+def run(game_modes, frames, seed, click_rate, aim_rate, fps=0):
+    pre_init_mixer()
+    pygame.init()
+    screen = pygame.display.set_mode((SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT))
+    preload_fonts()
+    load_sounds()
+    SETTINGS.RECORD_SESSIONS = False # in memory only, not saved to file
+    SETTINGS.SAVE_TELEMETRY = False
+    game = Game(screen)
+    results = []
+    for game_mode in game_modes:
+        settings_name, sweep = SWEEPS[game_mode]
+        for parameters in get_parameter_sets(sweep):
+            mode_settings = getattr(SETTINGS, settings_name) if settings_name else None
+            # change settings only in memory, saved settings stay untouched
+            previous_settings = {name: getattr(mode_settings, name) for name in parameters}
+            for name, value in parameters.items():
+                setattr(mode_settings, name, value)
+            random.seed(seed) # targets positions
+            stats = run_game_mode(game, game_mode, frames, random.Random(seed), click_rate, aim_rate, fps)
+            for name, value in previous_settings.items():
+                setattr(mode_settings, name, value)
+            results.append({"game_mode": game_mode, "parameters": parameters, **stats})
+            print(f"{game_mode} {parameters}: p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, {stats['frames_per_second']:.0f} FPS")
+    pygame.quit()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless frame time benchmark of pyaimbooster game modes")
+    parser.add_argument("--modes", nargs="+", default=list(SWEEPS), choices=list(SWEEPS))
+    parser.add_argument("--frames", type=int, default=600, help="frames per game mode and parameters set")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--click-rate", type=float, default=5, help="clicks per second of simulated game")
+    parser.add_argument("--aim-rate", type=float, default=0.7, help="chance of click being aimed at target")
+    parser.add_argument("--fps", type=int, default=0, help="frame rate cap and simulated frame rate, 0 for uncapped with simulated SETTINGS.FPS")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args(argv)
+
+    results = run(args.modes, args.frames, args.seed, args.click_rate, args.aim_rate, args.fps)
+    report = {
+        "pygame": pygame.version.ver,
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "fps": args.fps,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
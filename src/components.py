@@ -1,5 +1,8 @@
 import pygame
+import math
 from config import SETTINGS
+from fonts import get_font
+from sprites import text_cache
 
 
 # Rect with possibility to call callback function
@@ -34,7 +37,7 @@ class Button(CallbackRect):
 
     def draw(self):
         self.button_rect = pygame.draw.rect(self.screen, self.outline_color, self, self.outline_radius)
-        self.text_rect = self.font.render_to(self.screen, self.inflate([-p for p in self.padding]), self.text, self.text_color)
+        self.text_rect = text_cache.render_to(self.screen, self.inflate([-p for p in self.padding]), self.font, self.text, self.text_color)
 
 
 # Switch button with text change on toggle
@@ -68,7 +71,7 @@ class Switch():
     def draw(self):
         outline = 5
         # draw text
-        self.text_rect = self.font.render_to(self.screen, self.text_rect, self.current_text, self.text_color)
+        self.text_rect = text_cache.render_to(self.screen, self.text_rect, self.font, self.current_text, self.text_color)
         # prepare rect for switch, move down and size down
         self.switch_rect = self.text_rect.move(0, self.text_rect.height*1.3).inflate(-self.text_rect.width/2, 0) 
         # fill switch with color
@@ -96,18 +99,73 @@ class Switch():
         return False
 
 
+# Largest-Triangle-Three-Buckets downsampling, returns indices of at most threshold points
+# which preserve shape of data (points are equally spaced on x-axis)
+def downsample(values, threshold):
+    if threshold >= len(values) or threshold < 3:
+        return list(range(len(values)))
+    sampled = [0]
+    bucket_size = (len(values)-2)/(threshold-2)
+    a = 0 # previously selected point
+    for i in range(threshold-2):
+        # average of next bucket is third point of triangle
+        next_start = int((i+1)*bucket_size) + 1
+        next_end = min(int((i+2)*bucket_size) + 1, len(values))
+        avg_x = (next_start + next_end - 1)/2
+        avg_y = sum(values[next_start:next_end])/(next_end-next_start)
+        # choose point from current bucket which makes the largest triangle
+        start = int(i*bucket_size) + 1
+        end = int((i+1)*bucket_size) + 1
+        max_area = -1
+        for j in range(start, end):
+            area = abs((a-avg_x)*(values[j]-values[a]) - (a-j)*(avg_y-values[a]))
+            if area > max_area:
+                max_area = area
+                selected = j
+        sampled.append(selected)
+        a = selected
+    sampled.append(len(values)-1)
+    return sampled
+
+
+# returns data sorted by time and indices of points drawn in graph of given width,
+# doesn't use pygame, so it can be computed in other thread
+def prepare_graph_data(data, width):
+    if any(data[i][0] > data[i+1][0] for i in range(len(data)-1)):
+        data = sorted(data, key=lambda x: x[0])
+    return data, downsample([y for x, y in data], width)
+
+
 # Graph data ((time_1, value_1), (time_2, value_2)...) in Rect
 # Indices are beyond rect
 class Graph(pygame.Rect):
-    def __init__(self, screen, color, font_size, data, *args, draw_text_on_x_axis=False, draw_text_on_y_axis=False) -> None:
+    margins = (80, 15, 15, 50) # space for indices when rendering to own surface (left, top, right, bottom)
+
+    # sampled_indices - data and indices prepared by prepare_graph_data
+    def __init__(self, screen, color, font_size, data, *args, sampled_indices=None, draw_text_on_x_axis=False, draw_text_on_y_axis=False) -> None:
         super().__init__(*args)
         self.screen = screen
-        self.data = sorted(data, key=lambda x: x[0])
+        if sampled_indices is None:
+            data, sampled_indices = prepare_graph_data(data, self.width)
+        self.data = data
+        self.sampled_indices = sampled_indices
         self.color = color
         self.font_size = font_size
-        self.font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.font_size)
+        self.font = get_font(self.font_size)
         self.draw_text_on_x_axis = draw_text_on_x_axis
         self.draw_text_on_y_axis = draw_text_on_y_axis
+
+    # draw graph with indices on transparent surface, returns surface and its position on screen
+    def render(self):
+        left, top, right, bottom = self.margins
+        surface = pygame.Surface((self.width+left+right, self.height+top+bottom), pygame.SRCALPHA)
+        screen, position = self.screen, self.topleft
+        self.screen = surface
+        self.topleft = (left, top)
+        self.draw()
+        self.screen = screen
+        self.topleft = position
+        return surface, (self.x-left, self.y-top)
     
     def draw(self):
         if len(self.data) < 2:
@@ -134,21 +192,22 @@ class Graph(pygame.Rect):
                 pygame.draw.line(self.screen, self.color, (self.x-axes_width, y_screen_pos), (self.x+axes_width, y_screen_pos), index_width)
             if self.draw_text_on_y_axis:
                 # draw text value
-                text_rect = self.font.get_rect(str(y_value), size=self.font_size) 
+                text_rect = text_cache.get_rect(self.font, str(y_value), self.font_size) 
                 text_rect.midright = (self.x-indice_margin, y_screen_pos)
-                self.font.render_to(self.screen, text_rect, str(y_value), self.color)
+                text_cache.render_to(self.screen, text_rect, self.font, str(y_value), self.color, self.font_size)
         
-        for i, x_pos in enumerate(range(0, self.width+1, int(x_delta))):
+        indice_step = max(1, math.ceil(indice_gap/x_delta)) # data points between indices
+        for i in range(0, len(self.data), indice_step):
             x_value = self.data[i][0]
-            x_screen_pos = self.x+self.width-x_pos
+            x_screen_pos = self.x+i*x_delta
             # draw index line
-            if x_pos != 0 and x_pos != self.height: # don't draw lines on edges
-                pygame.draw.line(self.screen, self.color, (x_screen_pos, self.y+self.width-axes_width), (x_screen_pos, self.y+self.width+axes_width), index_width)
+            if i != 0 and i != len(self.data)-1: # don't draw lines on edges
+                pygame.draw.line(self.screen, self.color, (x_screen_pos, self.bottom-axes_width), (x_screen_pos, self.bottom+axes_width), index_width)
             if self.draw_text_on_x_axis:
                 # draw text value
-                text_rect = self.font.get_rect(str(x_value), size=self.font_size) 
+                text_rect = text_cache.get_rect(self.font, str(x_value), self.font_size) 
                 text_rect.midtop = (x_screen_pos, self.y+self.height+indice_margin)
-                self.font.render_to(self.screen, text_rect, str(x_value), self.color)
+                text_cache.render_to(self.screen, text_rect, self.font, str(x_value), self.color, self.font_size)
 
         # get data to draw
         prepared_data = self.get_normalized_data()
@@ -160,18 +219,40 @@ class Graph(pygame.Rect):
         min_y_value = 0
         max_y_value = max(self.data, key=lambda y: y[1])[1]
         x_delta = self.width/(len(self.data)-1)
-        y_delta = self.height/(max_y_value - min_y_value)
+        y_delta = self.height/((max_y_value - min_y_value) or 1)
         return x_delta, y_delta
 
-    # returns data according to rect size
+    # returns downsampled data according to rect size
     def get_normalized_data(self):
         x_delta, y_delta = self.get_deltas()
         normalized_data = []
-        for i, (x, y) in enumerate(self.data):
-            normalized_data.append((self.x+i*x_delta, self.bottom-y*y_delta))
+        for i in self.sampled_indices:
+            normalized_data.append((self.x+i*x_delta, self.bottom-self.data[i][1]*y_delta))
         return normalized_data
 
 
+# Rendered graphs with history revision they were made from
+class GraphCache():
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.graphs = {}
+
+    # returns (surface, position) or None if graph is missing or outdated
+    def get(self, key, revision):
+        cached = self.graphs.get(key)
+        if cached is None or cached[0] != revision:
+            return None
+        return cached[1]
+
+    def set(self, key, revision, rendered_graph):
+        if len(self.graphs) >= self.max_size and not key in self.graphs:
+            self.graphs.pop(next(iter(self.graphs))) # remove oldest graph
+        self.graphs[key] = (revision, rendered_graph)
+
+
+graph_cache = GraphCache()
+
+
 # Changeable tabs container 
 # tab_callbacks are designed for draw functions in empty area (get_empty_rect)
 class TabView(pygame.Rect):
@@ -182,27 +263,35 @@ class TabView(pygame.Rect):
         self.selected_tab_color = selected_tab_color
         self.text_color = text_color
         self.font_size = font_size
-        self.font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.font_size)
+        self.font = get_font(self.font_size)
         self.tab_labels = tab_labels
         self.tab_callbacks = tab_callbacks
         self.tab_label_width = self.font.get_rect(max(self.tab_labels, key=len), size=self.font_size).width + padding*2
         self.tab_label_height = font_size*2
         self.selected_tab = tab_labels[0]
-        self.tab_buttons = [] # needs to be manually checked by check_click method
+        self.tab_buttons = []
     
     def draw(self):
         self.screen.fill(self.bg_color, self)
         self.draw_tab_panel()
     
+    # tab buttons are created once and need to be manually checked by is_clicked method
+    def get_tab_buttons(self):
+        if not self.tab_buttons:
+            for i, tab_label in enumerate(self.tab_labels):
+                tab_rect = CallbackRect(0, 0, self.tab_label_width, self.tab_label_height)
+                tab_rect.center = self.get_tab_center(i)
+                tab_rect.set_callback(self.change_tab, tab_label)
+                self.tab_buttons.append(tab_rect)
+        return self.tab_buttons
+
+    def get_tab_center(self, i):
+        return [self.x+self.tab_label_width//2, self.y+self.tab_label_height//2+self.tab_label_height*i]
+
     def draw_tab_panel(self):
         tab_start_pos = [self.x, self.y]
-        for i, tab_label in enumerate(self.tab_labels):
-            tab_center = [tab_start_pos[0]+self.tab_label_width//2, 
-                          tab_start_pos[1]+self.tab_label_height//2+self.tab_label_height*i]
-            tab_rect = CallbackRect(0, 0, self.tab_label_width, self.tab_label_height)
-            tab_rect.center = tab_center
-            tab_rect.set_callback(self.change_tab, tab_label)
-            self.tab_buttons.append(tab_rect)
+        for i, (tab_label, tab_rect) in enumerate(zip(self.tab_labels, self.get_tab_buttons())):
+            tab_center = self.get_tab_center(i)
             if tab_label == self.selected_tab:
                 self.screen.fill(self.selected_tab_color, tab_rect)
             # draw seperating lines
@@ -213,9 +302,9 @@ class TabView(pygame.Rect):
                                 (separating_line_x, separating_line_y), 
                                 (separating_line_x+self.tab_label_width, separating_line_y))
             # draw text
-            text_rect = self.font.get_rect(tab_label, size=self.font_size) 
+            text_rect = text_cache.get_rect(self.font, tab_label, self.font_size) 
             text_rect.center = tab_center
-            self.font.render_to(self.screen, text_rect, tab_label, self.text_color)
+            text_cache.render_to(self.screen, text_rect, self.font, tab_label, self.text_color, self.font_size)
 
     def change_tab(self, tab_label):
         if tab_label in self.tab_labels:
@@ -303,12 +392,12 @@ class Slider(CallbackRect):
         min_text = str(self.min_value)
         max_text = str(self.max_value)
         text_y = self.centery+self.font_size*1.25
-        min_value_rect = self.font.get_rect(min_text, size=self.font_size) 
+        min_value_rect = text_cache.get_rect(self.font, min_text, self.font_size) 
         min_value_rect.topleft = (self.left, text_y)
-        self.min_text_rect = self.font.render_to(self.screen, min_value_rect, min_text, self.text_color)
-        max_value_rect = self.font.get_rect(max_text, size=self.font_size) 
+        self.min_text_rect = text_cache.render_to(self.screen, min_value_rect, self.font, min_text, self.text_color, self.font_size)
+        max_value_rect = text_cache.get_rect(self.font, max_text, self.font_size) 
         max_value_rect.topright = (self.right, text_y)
-        self.max_text_rect = self.font.render_to(self.screen, max_value_rect, max_text, self.text_color)
+        self.max_text_rect = text_cache.render_to(self.screen, max_value_rect, self.font, max_text, self.text_color, self.font_size)
         
     def check_slider(self):
         if self.focused:
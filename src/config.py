@@ -1,3 +1,8 @@
+import pathlib
+import json
+import time
+import os
+
 TargetLimits = {
                "max_radius": [1, 100],
                "grow": [0, 1],
@@ -7,7 +12,89 @@ TargetLimits = {
                "duration": [1, 5]
                } 
 
-class TargetSettings():
+# thousands of targets fit on screen only when they are small
+SwarmLimits = {
+               **TargetLimits,
+               "max_radius": [1, 3],
+               "swarm_size": [1000, 5000]
+               }
+
+# Settings file is read once on first use and changes are kept in memory until flush,
+# which writes whole file at once (atomic replace) only if something changed
+class SettingsStore():
+    def __init__(self, file_path, flush_delay=2.0):
+        self.file_path = file_path
+        self.flush_delay = flush_delay # seconds without changes before write-behind flush
+        self.settings = None # not read yet
+        self.dirty = False
+        self.last_change = 0
+
+    def load(self):
+        if self.settings is not None:
+            return
+        self.settings = {}
+        if not self.file_path.exists():
+            return
+        with self.file_path.open("r", encoding="utf-8") as settings:
+            for line in settings:
+                try:
+                    settings_name, settings_str = line.strip().split(maxsplit=1)
+                    self.settings[settings_name] = json.loads(settings_str)
+                except ValueError: # invalid line
+                    pass
+
+    def get(self, settings_name):
+        self.load()
+        return self.settings.get(settings_name, {})
+
+    def set(self, settings_name, settings):
+        self.load() # other settings in file have to be kept
+        self.settings[settings_name] = dict(settings)
+        self.dirty = True
+        self.last_change = time.monotonic()
+
+    def flush(self):
+        if not self.dirty:
+            return
+        tmp_path = self.file_path.with_name(self.file_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as new_settings:
+            for settings_name, settings in self.settings.items():
+                new_settings.write(settings_name + " " + json.dumps(settings) + "\n")
+            new_settings.flush()
+            os.fsync(new_settings.fileno())
+        os.replace(tmp_path, self.file_path)
+        self.dirty = False
+
+    # flush if there were no changes for flush_delay seconds
+    def flush_if_idle(self):
+        if self.dirty and time.monotonic() - self.last_change > self.flush_delay:
+            self.flush()
+
+
+# Settings saved between runs of game, defaults are replaced with saved values
+# by SETTINGS.load_saved_settings() when game starts
+class SavedSettings():
+    def load_saved_settings(self):
+        for name, setting in settings_store.get(self.__class__.__name__).items():
+            if hasattr(self, name):
+                setattr(self, name, setting)
+
+    # changes are written to file by settings_store.flush()
+    def save_settings(self):
+        settings_store.set(self.__class__.__name__, self.__dict__)
+
+class TargetSettings(SavedSettings):
+    def load_saved_settings(self):
+        super().load_saved_settings()
+        # saved values could be out of limits changed since they were saved
+        for name, (min_value, max_value) in self.get_limits().items():
+            if hasattr(self, name):
+                setattr(self, name, min(max(getattr(self, name), min_value), max_value))
+
+    # [min, max] of each setting shown on Settings screen
+    def get_limits(self):
+        return TargetLimits
+
     def get_target_setting(self, attr_name):
         try:
             return getattr(self, attr_name)
@@ -19,43 +106,11 @@ class TargetSettings():
         target_settings = {name:self.get_target_setting(name) for name in target_settings_names if self.get_target_setting(name) != None}
         return target_settings
 
-    def load_saved_settings(self):
-        import pathlib, json
-        settings_name_to_load = self.__class__.__name__
-        file_path = pathlib.Path.home() / "pyaimbooster.settings"
-        settings_to_load = {}
-        with file_path.open("r", encoding="utf-8") as settings:
-            for line in settings:
-                if line.startswith(settings_name_to_load):
-                    settings_to_load_str = line.split(maxsplit=1)[1]
-                    settings_to_load = json.loads(settings_to_load_str)
-                    break
-        for name, setting in settings_to_load.items():
-            if hasattr(self, name):
-                setattr(self, name, setting)
-
-    def save_settings(self):
-        import pathlib, json
-        settings_to_write = (json.dumps(self.__dict__))
-        settings_name_to_write = self.__class__.__name__
-        file_path = pathlib.Path.home() / "pyaimbooster.settings"
-        file_path.touch(exist_ok=True)
-        all_settings = {}
-        with file_path.open("r", encoding="utf-8") as old_settings:
-            for line in old_settings:
-                settings_name, settings = line.strip().split(maxsplit=1)
-                all_settings[settings_name] = settings
-        all_settings[settings_name_to_write] = settings_to_write
-        with file_path.open("w", encoding="utf-8") as new_settings:
-            for settings_name, settings in all_settings.items():
-                new_settings.write(settings_name + " " + settings_to_write + "\n")
-
 class AWPSettings(TargetSettings):
     def __init__(self):
         self.max_radius = 10
         self.grow = 0
         self.outline_margin = 2
-        self.load_saved_settings()
 
 class ArcadeSettings(TargetSettings):
     def __init__(self):
@@ -64,7 +119,6 @@ class ArcadeSettings(TargetSettings):
         self.outline_margin = 4
         self.spawn_rate = 3 # targets per second 
         self.duration = 2
-        self.load_saved_settings()
 
 class SpeedyFingersSettings(TargetSettings):
     def __init__(self):
@@ -72,7 +126,32 @@ class SpeedyFingersSettings(TargetSettings):
         self.grow = 0
         self.outline_margin = 4
         self.targets_amount = 5
-        self.load_saved_settings()
+
+# targets don't grow, each one is drawn only once when it spawns
+class SwarmSettings(TargetSettings):
+    def __init__(self):
+        self.max_radius = 3
+        self.outline_margin = 1
+        self.swarm_size = 2000 # targets on screen at once
+
+    def get_limits(self):
+        return SwarmLimits
+
+# Game is always rendered in SCREEN_WIDTH x SCREEN_HEIGHT (logical resolution),
+# display only scales it to window or whole screen
+class DisplaySettings(SavedSettings):
+    def __init__(self):
+        self.fullscreen = False
+        self.vsync = 0 # 1 - wait for vertical blank, FPS is limited by monitor refresh rate
+
+# Sounds of shots, smaller mixer buffer gives shorter delay from click to sound,
+# but can crackle on slow machines
+class AudioSettings(SavedSettings):
+    def __init__(self):
+        self.low_latency = True
+        self.buffer = 256 # samples in mixer buffer in low latency mode
+        self.frequency = 44100
+        self.channels = 8 # reserved for shot sounds, oldest sound is stopped when all are busy
 
 class Appearance():
     def __init__(self):
@@ -81,6 +160,7 @@ class Appearance():
         self.outline_color = (0, 0, 0) 
         self.filling_color = (255, 255, 255)
         self.score_color = (74, 74, 74)
+        self.score_fontsize = 30
         self.lobby_bg_color = self.background_color
         self.lobby_color = self.score_color
         self.lobby_fontsize = 40
@@ -99,18 +179,38 @@ class Appearance():
         self.settings_fontsize = 20
         self.settings_buttons_fontsize = self.summary_fontsize
         self.slider_fontsize = 15
+        self.profiler_fontsize = 12
+        self.profiler_color = (255, 255, 255)
+        self.profiler_bg_color = (40, 40, 40)
 
 class AllSettings():
     def __init__(self):
-        self.SCREEN_WIDTH = 800
+        self.SCREEN_WIDTH = 800 # logical and render resolution, independent of window size
         self.SCREEN_HEIGHT = 600
         self.FPS = 144
+        self.SIM_STEP = 1000/240 # miliseconds of target simulation per step, independent of FPS
+        self.MAX_SIM_STEPS = 60 # per frame, longer stalls are not caught up
+        self.DIRTY_RECTS = True # update only changed parts of screen in shooting modes
         self.CHALLENGE_TIME = 10*1000 # 30 seconds
+        self.RECORD_SESSIONS = True # save input of shooting modes rounds for replay
+        self.SESSIONS_DIR = pathlib.Path.home() / "pyaimbooster_sessions"
+        self.SAVE_TELEMETRY = True # save every shot of shooting modes rounds for analysis
+        self.TELEMETRY_FORMAT = "npz" # or "csv"
+        self.TELEMETRY_DIR = pathlib.Path.home() / "pyaimbooster_telemetry"
         self.AWP = AWPSettings()
         self.Arcade = ArcadeSettings()
         self.SpeedyFingers = SpeedyFingersSettings()
+        self.Swarm = SwarmSettings()
         self.Appearance = Appearance()
+        self.Display = DisplaySettings()
+        self.Audio = AudioSettings()
         self.TargetLimits = TargetLimits
 
+    def load_saved_settings(self):
+        for settings in vars(self).values():
+            if isinstance(settings, SavedSettings):
+                settings.load_saved_settings()
+
 
+settings_store = SettingsStore(pathlib.Path.home() / "pyaimbooster.settings")
 SETTINGS = AllSettings()
\ No newline at end of file
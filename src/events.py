@@ -0,0 +1,48 @@
+import time
+import pygame
+from recording import session_recorder, PUMP
+
+
+# Takes events from queue once per frame and calls handlers registered for event types.
+# Game-wide handlers are called first, then handlers of active game mode.
+class EventDispatcher():
+    def __init__(self):
+        self.handlers = {}
+        self.game_mode_handlers = {}
+        self.game_mode_changed = False # in current batch of events
+        self.pump_time = time.perf_counter() # when events were taken from queue last time
+        self.previous_pump_time = self.pump_time
+
+    # SDL puts only given event types into queue, e.g. mouse motion floods are dropped
+    def set_allowed(self, event_types):
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(event_types))
+
+    def register(self, event_type, handler):
+        self.handlers[event_type] = handler
+
+    def set_game_mode_handlers(self, handlers):
+        self.game_mode_handlers = handlers
+        self.game_mode_changed = True
+
+    # events happened between previous and current pump
+    def pump(self):
+        events = pygame.event.get()
+        self.previous_pump_time = self.pump_time
+        self.pump_time = time.perf_counter()
+        session_recorder.record_time(PUMP, self.pump_time)
+        return events
+
+    def dispatch(self):
+        self.game_mode_changed = False
+        for event in self.pump():
+            handler = self.handlers.get(event.type)
+            if handler:
+                handler(event)
+            # rest of batch happened in previous game mode, e.g. second click of double click
+            # on button would shoot in new game mode, so only game-wide handlers get it
+            if self.game_mode_changed:
+                continue
+            handler = self.game_mode_handlers.get(event.type)
+            if handler:
+                handler(event)
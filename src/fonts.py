@@ -0,0 +1,23 @@
+import pygame
+import pygame.freetype
+from config import SETTINGS
+
+
+# Fonts loaded once per (path, size) and shared by whole game,
+# creating freetype.Font reads and parses font file every time
+fonts = {
+}
+
+def get_font(size, path=None):
+    if path is None:
+        path = SETTINGS.Appearance.default_font
+    font = fonts.get((path, size))
+    if font is None:
+        font = fonts[(path, size)] = pygame.freetype.Font(path, size)
+    return font
+
+# load fonts for every font size declared in Appearance
+def preload_fonts():
+    for name, value in vars(SETTINGS.Appearance).items():
+        if name.endswith("fontsize"):
+            get_font(value)
@@ -1,124 +1,256 @@
 import pygame
+import time
 import random
 import history
-from config import SETTINGS
-from components import Button, Switch, Graph, TabView, Slider
+from collections import deque
+from config import SETTINGS, settings_store
+from fonts import get_font
+from components import Button, Switch, Graph, TabView, Slider, graph_cache, prepare_graph_data
+from sprites import target_sprites, text_cache
+from spawning import SpawnGrid, SpawnPool, get_spawn_positions
+from targetfield import TargetField
+from profiler import frame_profiler
+import recording
+from recording import session_recorder
+from telemetry import shot_telemetry
 from sounds import (hit_sound, miss_sound)
 
 
 # BLUEPRINT:
 # class GameMode():
-#     def __init__(self, screen):
-#         self.screen = screen
+#     def __init__(self, screen, game):
+#         self.screen = screen # game modes are created once and reused
+
+#     def prepare(self):
+#         pass # build layout ahead of entering game mode, without drawing
+
+#     def reset(self):
+#         pass # reset state on every entering game mode
 
 #     def load(self):
 #         pass
 
-#     def frame(self):
-#         pass
+#     def frame(self, frame_time=None):
+#         pass # frame_time - miliseconds to simulate, measured with clock when None
 
 
-class Target():
-    def __init__(self, screen, grow=0, max_radius=50, duration=1.0, outline_margin=4, forbidden_rects=[]):
-        self.radius = 0
-        self.screen = screen
-        self.forbidden_rects = forbidden_rects
-        self.max_radius = max_radius
-        self.duration = duration
-        self.grow = grow
-        self.grow_step = max_radius/(duration*1000/2) # radius increase per milisecond
-        self.outline_margin = outline_margin
-        self.pos = self.get_allowed_pos()
-        self.reached_max = False
-        if not grow:
-            self.radius = self.max_radius
-    
-    def update(self, delta_time=0):
-        if self.grow:
-            if self.radius < self.max_radius and not self.reached_max:
-                self.radius += self.grow_step * delta_time
-            else:
-                self.reached_max = True
-                self.radius -= self.grow_step * delta_time
-                # destroy this object if smaller than 1px
-                if self.radius <= 0:
-                    return False 
-        self.draw()
-
-    def draw(self):
-        # draw outline
-        pygame.draw.circle(self.screen, SETTINGS.Appearance.outline_color, self.pos, self.radius, self.outline_margin)
-        # draw filling
-        pygame.draw.circle(self.screen, SETTINGS.Appearance.filling_color, self.pos, self.radius-self.outline_margin)
-
-    def mouse_collides(self, mouse_pos):
-        if pow((mouse_pos[0] - self.pos[0]), 2) + pow((mouse_pos[1] - self.pos[1]), 2) <= pow(self.radius, 2):
-            return True
-    
-    def get_random_pos(self, margin=0):
-        x = random.randint(margin, SETTINGS.SCREEN_WIDTH-margin)
-        y = random.randint(margin, SETTINGS.SCREEN_HEIGHT-margin)
-        return (x, y)
-    
-    # get free space for spawn
-    def get_allowed_pos(self):
-        for i in range(200): # to prevent freezing if there is no more space for targets
-            pos = self.get_random_pos(self.max_radius)
-            if not self.rect_in_forbidden_area(pos):
-                return pos
-        return (100, 100)
-
-    # check if targets would overlap
-    def rect_in_forbidden_area(self, pos):
-        rect_to_check = self.get_final_rect(pos)
-        for rect in self.forbidden_rects:
-            if rect.colliderect(rect_to_check):
-                return True
-        return False
-    
-    # get max occupied space as rect
-    def get_final_rect(self, center=None):
-        rect = pygame.Rect((0, 0), (self.max_radius*2, self.max_radius*2))
-        if center == None:
-            rect.center = self.pos
-        else:
-            rect.center = center
-        return rect
+class StaticButtons():
+    def prepare(self):
+        pass
 
+    def reset(self):
+        pass
 
-class StaticButtons():
-    def frame(self):
-        for event in pygame.event.get(): # add type of event to get
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                for button in self.buttons:
-                    if button.is_clicked(pygame.mouse.get_pos()):
-                        break
+    # static screens draw only on demand, so whole display is updated
+    def get_dirty_rects(self):
+        return None
+
+    def display_updated(self, update_time):
+        pass
+
+    def get_event_handlers(self):
+        return {pygame.MOUSEBUTTONDOWN: self.click_buttons}
+
+    def click_buttons(self, event):
+        for button in self.buttons:
+            if button.is_clicked(event.pos):
+                break
+
+    def frame(self, frame_time=None):
+        pass
 
 
 class ShootingMode():
     def __init__(self, screen, game):
-        game.reset() # reset events and scoreboard
-        if game.challenge == True:
-            pygame.time.set_timer(game.events["END_CHALLENGE"], SETTINGS.CHALLENGE_TIME, once=True)
         self.screen = screen
         self.game = game
-        self.scoreCounter = game.scoreCounter
-        self.targets_to_delete = []
-        self.targets = []
+        self.targets = TargetField()
+        self.spawn_grid = SpawnGrid(SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT)
+        self.rng = random.Random() # spawn positions, seeded on every round
+
+    def prepare(self):
+        self.warm_target_sprites(self.get_settings())
+        self.get_spawn_positions(wait=False) # missing pool starts generating in background
+
+    def reset(self):
+        self.game.reset() # reset events and scoreboard
+        if self.game.challenge == True:
+            pygame.time.set_timer(self.game.events["END_CHALLENGE"], SETTINGS.CHALLENGE_TIME, loops=1)
+        self.scoreCounter = self.game.scoreCounter
+        self.targets_to_delete = [] # indices of targets in self.targets
+        self.targets.clear()
+        self.spawn_grid.clear()
+        self.spawn_pool = None # created with first spawn from seeded rng
+        self.full_redraw = True # first frame of mode always redraws whole screen
+        self.drawn_rects = [] # rects touched in current frame
+        self.erased_rects = [] # rects from previous frame cleared in current frame
+        self.sim_time_left = 0 # miliseconds not simulated yet
+        self.last_frame_time = time.perf_counter()
+        game_mode = self.game.get_game_mode_name(self)
+        # until pool is generated, free space is searched on whole screen for the whole round
+        # (replayed round waits for pool or doesn't use it, like recorded one)
+        use_spawn_pool = session_recorder.next_spawn_pool
+        if use_spawn_pool is None:
+            self.spawn_positions = self.get_spawn_positions(wait=False)
+        else:
+            self.spawn_positions = self.get_spawn_positions() if use_spawn_pool else None
+        seed = session_recorder.start(game_mode, self.get_settings(), self.scoreCounter.start_time, self.spawn_positions is not None)
+        shot_telemetry.start(game_mode, self.scoreCounter.start_time)
+        self.rng.seed(seed)
+
+    # clear whole screen or only rects drawn in previous frame
+    def clear_screen(self):
+        if self.full_redraw or not SETTINGS.DIRTY_RECTS:
+            self.screen.fill(SETTINGS.Appearance.background_color)
+        else:
+            for rect in self.drawn_rects:
+                self.screen.fill(SETTINGS.Appearance.background_color, rect)
+        self.erased_rects = self.drawn_rects
+        self.drawn_rects = []
+
+    def add_dirty_rect(self, rect):
+        if rect:
+            self.drawn_rects.append(rect)
+
+    # returns rects to update on display or None if whole display needs update
+    def get_dirty_rects(self):
+        if self.full_redraw or not SETTINGS.DIRTY_RECTS:
+            self.full_redraw = False
+            return None
+        return self.erased_rects + self.drawn_rects
+
+    def get_event_handlers(self):
+        return {
+            pygame.MOUSEBUTTONDOWN: self.on_click,
+            self.game.events["ADD_TARGET"]: self.on_add_target
+        }
 
-    def get_occupied_rects(self):
-        occupied = []
-        for target in self.targets:
-            occupied.append(target.get_final_rect())
-        return occupied
+    def on_click(self, event):
+        session_recorder.record(recording.CLICK, x=event.pos[0], y=event.pos[1])
+        self.record_shot(event.pos)
+        self.shoot(event)
+
+    # save shot with target which was hit or was the closest one
+    def record_shot(self, pos):
+        target = self.targets.hit_test(pos)
+        hit = target is not None
+        if not hit:
+            target = self.targets.nearest(pos)
+        if target is None:
+            target_pos, target_radius, target_age = (-1, -1), -1, -1
+        else:
+            target_pos = self.targets.get_pos(target)
+            target_radius = self.targets.get_radius(target)
+            target_age = self.targets.age[target]
+        shot_telemetry.record(self.game.event_dispatcher.pump_time, pos, target_pos, target_radius, hit, target_age)
+
+    def shoot(self, event):
+        self.scoreCounter.add_shoot()
+        target = self.targets.hit_test(event.pos)
+        if target is not None:
+            hit_sound.play(self.game.event_dispatcher.pump_time)
+            self.add_hit(target)
+            self.targets_to_delete.append(target)
+            self.on_target_hit(target)
+        else:
+            miss_sound.play(self.game.event_dispatcher.pump_time)
+
+    # hit target is counted and replaced with new one, game modes with other rules override it
+    def on_target_hit(self, target):
+        self.scoreCounter.add_target()
+        pygame.event.post(pygame.event.Event(self.game.events["ADD_TARGET"]))
+
+    def on_add_target(self, event):
+        session_recorder.record(recording.ADD_TARGET)
+        self.add_target()
+
+    # click time is time of taking events from queue, click happened after previous one
+    def add_hit(self, target):
+        event_dispatcher = self.game.event_dispatcher
+        timing_error = event_dispatcher.pump_time - event_dispatcher.previous_pump_time
+        self.scoreCounter.add_hit(event_dispatcher.pump_time, self.targets.get_shown_time(target), timing_error)
+
+    # new targets become visible to player after display update
+    def display_updated(self, update_time):
+        session_recorder.record_time(recording.SHOWN, update_time)
+        self.targets.mark_shown(update_time)
+
+    def warm_target_sprites(self, mode_settings):
+        target_sprites.warm(mode_settings.max_radius, mode_settings.outline_margin, bool(mode_settings.get_target_setting("grow")))
+
+    # miliseconds since previous frame, replay gives recorded frame time instead
+    def get_frame_time(self, frame_time=None):
+        if frame_time is None:
+            now = time.perf_counter()
+            frame_time = (now - self.last_frame_time)*1000
+            self.last_frame_time = now
+        session_recorder.record(recording.FRAME, frame_time)
+        return frame_time
+
+    # run fixed simulation steps for time elapsed since previous frame,
+    # returns fraction of step left for interpolation of drawn targets
+    def simulate(self, frame_time=None):
+        self.sim_time_left += self.get_frame_time(frame_time)
+        steps = int(self.sim_time_left // SETTINGS.SIM_STEP)
+        if steps > SETTINGS.MAX_SIM_STEPS: # e.g. window was dragged, drop time instead of catching up
+            steps = SETTINGS.MAX_SIM_STEPS
+            self.sim_time_left = steps*SETTINGS.SIM_STEP
+        for i in range(steps):
+            self.step(SETTINGS.SIM_STEP)
+        self.sim_time_left -= steps*SETTINGS.SIM_STEP
+        return self.sim_time_left / SETTINGS.SIM_STEP
+
+    # one simulation step of delta_time miliseconds
+    def step(self, delta_time):
+        self.targets_to_delete.extend(self.targets.update(delta_time))
+
+    def draw_targets(self, alpha=1.0):
+        for rect in self.targets.draw(self.screen, alpha):
+            self.add_dirty_rect(rect)
+
+    def update_counter(self):
+        self.add_dirty_rect(self.scoreCounter.update())
+
+    # returns None if pool is still generated in background and wait is False
+    def get_spawn_positions(self, wait=True):
+        return get_spawn_positions(SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT, self.get_settings().max_radius, wait=wait)
+
+    # spawn target in free space, returns None if there is no more space for targets
+    def spawn_target(self, mode_settings):
+        target_settings = mode_settings.get_target_settings()
+        radius = target_settings["max_radius"]
+        if self.spawn_pool is None and self.spawn_positions is not None:
+            self.spawn_pool = SpawnPool(self.spawn_positions, self.rng)
+        pos = None
+        if self.spawn_pool is not None:
+            pos = self.spawn_pool.next_free_pos(self.spawn_grid, radius)
+        if pos is None: # pool isn't ready or its positions are taken, search whole screen
+            pos = self.spawn_grid.find_free_pos(radius, self.rng)
+        if pos is None:
+            return None
+        new_target = self.targets.add(pos, **target_settings)
+        session_recorder.record(recording.SPAWN, x=pos[0], y=pos[1])
+        self.spawn_grid.occupy(self.targets.get_final_rect(new_target))
+        return new_target
+
+    # delete targets waiting for deletion, returns number of deleted targets
+    # (the same target could be clicked twice before deletion)
+    def remove_targets(self):
+        indices = set(self.targets_to_delete)
+        for i in indices:
+            self.spawn_grid.release(self.targets.get_final_rect(i))
+        self.targets_to_delete = []
+        return self.targets.remove(indices)
     
     def save_results(self):
         results = {
             "Hits": self.scoreCounter.get_hits(),
             "Accuracy": self.scoreCounter.get_accuracy(),
-            "Median response": self.scoreCounter.get_median_reaction_time()
+            "Median response": self.scoreCounter.get_median_reaction_time(),
+            "Median spawn response": self.scoreCounter.get_median_spawn_reaction_time()
         }
-        history.add_results(self.game.game_mode, results)
+        # saved in history worker, returns Future checked by summary
+        return history.add_results(self.game.game_mode, results, self.scoreCounter.get_sketches())
 
 
 class Lobby(StaticButtons):
@@ -126,13 +258,16 @@ class Lobby(StaticButtons):
         self.screen = screen
         self.game = game
         self.buttons = []
+        self.switch = None
 
-    def load(self):
-        self.screen.fill(SETTINGS.Appearance.lobby_bg_color)
-        gamemodes = ["Arcade", "Speedy fingers", "AWP", "Settings"]
+    # create buttons once, they are only redrawn on next loads
+    def prepare(self):
+        if self.buttons:
+            return
+        gamemodes = ["Arcade", "Speedy fingers", "AWP", "Swarm", "Settings"]
         
         # prepare variables for buttons
-        font = pygame.freetype.Font(SETTINGS.Appearance.default_font, SETTINGS.Appearance.lobby_fontsize)
+        font = get_font(SETTINGS.Appearance.lobby_fontsize)
         gap_betweens_buttons = SETTINGS.Appearance.lobby_fontsize * 1.3
         buttons_padding = SETTINGS.Appearance.buttons_padding
         screen_center = self.screen.get_rect().center
@@ -147,9 +282,8 @@ class Lobby(StaticButtons):
             text_rect = biggest_rect 
             text_rect.center = (start_x, start_y + gap_betweens_buttons * i)
             
-            # create and render button  
+            # create button  
             button = Button(self.screen, font, gamemode, SETTINGS.Appearance.lobby_color, buttons_padding, SETTINGS.Appearance.lobby_color, 5, text_rect)
-            button.draw()
 
             # set callbacks to change game mode
             button.set_callback(self.game.change_game_mode, gamemode)
@@ -158,36 +292,37 @@ class Lobby(StaticButtons):
         # Create switch for challenge/training mode
         text_rect = font.get_rect("Training", size=SETTINGS.Appearance.lobby_fontsize)
         text_rect.topright = self.screen.get_rect().inflate(-20, -20).topright
-        switch = Switch(self.screen, font, "Training", "Challng", SETTINGS.Appearance.lobby_color, text_rect)
-        switch.set_callback(self.game.set_challenge)
-        self.buttons.append(switch)
+        self.switch = Switch(self.screen, font, "Training", "Challng", SETTINGS.Appearance.lobby_color, text_rect)
+        self.switch.set_callback(self.game.set_challenge)
+        self.buttons.append(self.switch)
 
+    def load(self):
+        self.prepare()
+        self.screen.fill(SETTINGS.Appearance.lobby_bg_color)
         # Check if switch was toggled earlier
-        if self.game.challenge == True:
-            switch.toggle() 
+        if self.switch.is_on() != self.game.challenge:
+            self.switch.toggle()
+        for button in self.buttons:
+            button.draw()
 
 
 class Summary(StaticButtons):
     def __init__(self, screen, game):
         self.screen = screen
         self.game = game
-        self.scoreCounter = game.scoreCounter
-        self.previous_game_mode = game.game_mode # change this name to more precise
         self.buttons = []
-        self.result_types = history.get_result_types(self.previous_game_mode)
-        self.current_graph_type = self.result_types[0] if self.result_types else ""
         self.font_size = SETTINGS.Appearance.summary_fontsize
-        self.font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.font_size)
+        self.font = get_font(self.font_size)
         self.buttons_padding = SETTINGS.Appearance.buttons_padding
+        self.tab_view = None
         self.next_button = None
         self.previous_button = None
         self.play_again_button = None
         self.return_button = None
 
-    def load(self):
-        # prepare
-        self.screen.fill(SETTINGS.Appearance.summary_bg_color)
-        
+    def prepare(self):
+        if self.tab_view:
+            return
         # create TabView
         self.tab_view = TabView(self.screen,
                              SETTINGS.Appearance.tab_view_bg_color, 
@@ -196,23 +331,83 @@ class Summary(StaticButtons):
                              SETTINGS.Appearance.tab_fontsize, 
                              ["Results", "Graphs"], [self.show_results, self.show_graph], 10, (0, 0, 600, 500))
         self.tab_view.center = self.screen.get_rect().center
+        self.buttons.extend(self.tab_view.get_tab_buttons())
+
+    def reset(self):
+        self.scoreCounter = self.game.scoreCounter
+        self.previous_game_mode = self.game.game_mode # change this name to more precise
+        # numbers of this round are shown at once, history is read in worker and shown when ready
+        self.result_types = []
+        self.current_graph_type = ""
+        self.history_stats = None
+        self.history_job = history.run_in_background(get_history_stats, self.previous_game_mode)
+        self.graph_jobs = {} # graph key: Future of graph data and sampled indices
+        self.save_job = self.game.save_job # Future of saving round, None if round wasn't saved
+        self.game.save_job = None
+        self.save_error = None
+        self.history_error = None
+        if self.play_again_button:
+            self.play_again_button.set_callback(self.game.change_game_mode, self.previous_game_mode)
+
+    def load(self):
+        # prepare
+        self.prepare()
+        self.screen.fill(SETTINGS.Appearance.summary_bg_color)
+        self.tab_view.selected_tab = self.tab_view.tab_labels[0]
         self.tab_view.draw()
-        self.buttons.extend(self.tab_view.tab_buttons)
 
         # show stats
         self.show_results()
 
+    # draw history statistics and graphs computed in worker since last frame
+    # errors of worker (e.g. full disk, damaged history) are shown instead of raised in game
+    def frame(self, frame_time=None):
+        redraw = False
+        if self.save_job is not None and self.save_job.done():
+            if self.save_job.exception() is not None:
+                self.save_error = "Round not saved"
+                redraw = True
+            self.save_job = None
+        if self.history_job is not None and self.history_job.done():
+            if self.history_job.exception() is None:
+                self.history_stats = self.history_job.result()
+                self.result_types = list(self.history_stats["counts"])
+                self.current_graph_type = self.result_types[0] if self.result_types else ""
+            else:
+                self.history_error = "History unavailable"
+            self.history_job = None
+            redraw = True
+        for graph_key, graph_job in list(self.graph_jobs.items()):
+            if graph_job.done():
+                del self.graph_jobs[graph_key]
+                if graph_job.exception() is None:
+                    data, sampled_indices = graph_job.result()
+                    graph_rect = pygame.Rect(graph_key[2])
+                    graph = Graph(self.screen, SETTINGS.Appearance.summary_color, SETTINGS.Appearance.graph_fontsize, data, graph_rect, sampled_indices=sampled_indices, draw_text_on_y_axis=True)
+                    graph_cache.set(graph_key, self.history_stats["revision"], graph.render())
+                else:
+                    self.history_error = "History unavailable"
+                redraw = True
+        if redraw:
+            self.tab_view.draw()
+            self.tab_view.tab_callbacks[self.tab_view.tab_labels.index(self.tab_view.selected_tab)]()
+
+    def show_message(self, text):
+        text_rect = text_cache.get_rect(self.font, text, self.font_size)
+        text_rect.center = self.tab_view.get_empty_rect().center
+        text_cache.render_to(self.screen, text_rect, self.font, text, SETTINGS.Appearance.summary_color, self.font_size)
+
     def show_main_buttons(self):
         midbottom = self.tab_view.midbottom 
         if not self.play_again_button:
-            play_rect = self.font.get_rect("Play again", size=self.font_size) 
+            play_rect = text_cache.get_rect(self.font, "Play again", self.font_size) 
             play_rect.midright = midbottom
             play_rect.move_ip(-self.buttons_padding[0], -self.font_size) # to give some space between buttons
             self.play_again_button = Button(self.screen, self.font, "Play again", SETTINGS.Appearance.summary_color, self.buttons_padding, SETTINGS.Appearance.summary_color, 5, play_rect)
             self.play_again_button.set_callback(self.game.change_game_mode, self.previous_game_mode)
             self.buttons.append(self.play_again_button)
         if not self.return_button:
-            return_rect = self.font.get_rect("Return", size=self.font_size) 
+            return_rect = text_cache.get_rect(self.font, "Return", self.font_size) 
             return_rect.midleft = midbottom
             return_rect.move_ip(self.buttons_padding[0], -self.font_size)
             self.return_button = Button(self.screen, self.font, "Return", SETTINGS.Appearance.summary_color, self.buttons_padding, SETTINGS.Appearance.summary_color, 5, return_rect)
@@ -224,27 +419,49 @@ class Summary(StaticButtons):
     def show_results(self):
         def show_variable(text, var, pos):
             var_text = f"{text}: {var}"
-            text_rect = self.font.get_rect(var_text, size=self.font_size) 
+            text_rect = text_cache.get_rect(self.font, var_text, self.font_size) 
             text_rect.topleft = pos.topleft
-            self.font.render_to(self.screen, text_rect, var_text, SETTINGS.Appearance.summary_color)
+            text_cache.render_to(self.screen, text_rect, self.font, var_text, SETTINGS.Appearance.summary_color, self.font_size)
 
         gap = self.font_size * 1.5
         hits_ratio = f"{self.scoreCounter.get_hits()}/{self.scoreCounter.get_all_targets()}"
         response_time = f"{int(self.scoreCounter.get_median_reaction_time()*1000)} msec"
+        spawn_response_time = f"{int(self.scoreCounter.get_median_spawn_reaction_time()*1000)} msec"
+        timing_error = f"{self.scoreCounter.get_timing_error()*1000:.1f} msec"
+        round_stats = self.scoreCounter.get_reaction_time_stats()
+        round_percentiles = f"{int(round_stats['p90']*1000)}/{int(round_stats['p99']*1000)} msec"
+        if self.history_error is not None:
+            all_percentiles = "-"
+        elif self.history_stats is None:
+            all_percentiles = "..."
+        else:
+            all_stats = self.history_stats["percentiles"]
+            all_percentiles = f"{int(all_stats['p50']*1000)}/{int(all_stats['p90']*1000)} msec"
         start = self.tab_view.get_empty_rect().move(SETTINGS.Appearance.summary_padding, SETTINGS.Appearance.summary_padding)
         show_variable("Hits", hits_ratio, start.move(0, gap))
         show_variable("Accuracy", f"{self.scoreCounter.get_accuracy()}%", start)
         show_variable("Time", f"{self.scoreCounter.get_time()} s", start.move(0, gap*2))
         show_variable("M. response", response_time, start.move(0, gap*3))
+        show_variable("S. response", spawn_response_time, start.move(0, gap*4))
+        show_variable("Timing error", timing_error, start.move(0, gap*5))
+        show_variable("Response p90/p99", round_percentiles, start.move(0, gap*6))
+        show_variable("All rounds p50/p90", all_percentiles, start.move(0, gap*7))
+        if self.save_error is not None:
+            text_rect = text_cache.get_rect(self.font, self.save_error, self.font_size)
+            text_rect.topleft = start.move(0, gap*8).topleft
+            text_cache.render_to(self.screen, text_rect, self.font, self.save_error, SETTINGS.Appearance.summary_color, self.font_size)
         self.show_main_buttons()
 
     def show_graph(self):
         self.tab_view.draw()
-        results_to_graph = history.get_selected_results(self.previous_game_mode, self.current_graph_type)
-        if len(results_to_graph) > 1:
+        if self.history_error is not None:
+            self.show_message(self.history_error)
+        elif self.history_stats is None:
+            self.show_message("Loading history...")
+        elif self.history_stats["counts"].get(self.current_graph_type, 0) > 1:
             if not self.previous_button:
                 previous_button_pos = self.tab_view.get_empty_rect().move(SETTINGS.Appearance.summary_padding, SETTINGS.Appearance.summary_padding)
-                previous_button_rect = self.font.get_rect("<", size=self.font_size) 
+                previous_button_rect = text_cache.get_rect(self.font, "<", self.font_size) 
                 previous_button_rect.topleft = previous_button_pos.topleft
                 self.previous_button = Button(self.screen, self.font, "<", SETTINGS.Appearance.summary_color, self.buttons_padding, SETTINGS.Appearance.summary_color, 5, previous_button_rect)
                 self.previous_button.set_callback(self.previous_graph)
@@ -252,7 +469,7 @@ class Summary(StaticButtons):
 
             if not self.next_button:
                 next_button_pos = self.tab_view.get_empty_rect().move(self.tab_view.get_empty_rect().width-SETTINGS.Appearance.summary_padding, SETTINGS.Appearance.summary_padding)
-                next_button_rect = self.font.get_rect(">", size=self.font_size) 
+                next_button_rect = text_cache.get_rect(self.font, ">", self.font_size) 
                 next_button_rect.topright = next_button_pos.topleft
                 self.next_button = Button(self.screen, self.font, ">", SETTINGS.Appearance.summary_color, self.buttons_padding, SETTINGS.Appearance.summary_color, 5, next_button_rect)
                 self.next_button.set_callback(self.next_graph)
@@ -262,70 +479,96 @@ class Summary(StaticButtons):
             self.next_button.draw()
             self.previous_button.draw()
 
-            # draw graph
-            graph = Graph(self.screen, SETTINGS.Appearance.summary_color, SETTINGS.Appearance.graph_fontsize, results_to_graph, (0, 0, 300, 300), draw_text_on_y_axis=True)
-            graph.center = self.tab_view.get_empty_rect().center
-            graph.draw()
+            # draw graph, its series are computed in worker again only if there are new results
+            graph_rect = pygame.Rect(0, 0, 300, 300)
+            graph_rect.center = self.tab_view.get_empty_rect().center
+            graph_key = (self.previous_game_mode, self.current_graph_type, tuple(graph_rect))
+            rendered_graph = graph_cache.get(graph_key, self.history_stats["revision"])
+            if rendered_graph is not None:
+                self.screen.blit(*rendered_graph)
+            else:
+                if not graph_key in self.graph_jobs:
+                    self.graph_jobs[graph_key] = history.run_in_background(get_graph_data, self.previous_game_mode, self.current_graph_type, graph_rect.width)
+                self.show_message("Loading graph...")
 
             # draw graph title
-            title_rect = self.font.get_rect(self.current_graph_type, size=self.font_size)
+            title_rect = text_cache.get_rect(self.font, self.current_graph_type, self.font_size)
             title_rect.center = self.tab_view.get_empty_rect().center
             title_rect.y = self.next_button.text_rect.y # align graph title height to buttons text
-            self.font.render_to(self.screen, title_rect, self.current_graph_type, SETTINGS.Appearance.summary_color)
+            text_cache.render_to(self.screen, title_rect, self.font, self.current_graph_type, SETTINGS.Appearance.summary_color, self.font_size)
         else:
-            text = f"Not enough data for graph"
-            text_rect = self.font.get_rect(text, size=self.font_size)
-            text_rect.center = self.tab_view.get_empty_rect().center
-            self.font.render_to(self.screen, text_rect, text, SETTINGS.Appearance.summary_color)
+            self.show_message("Not enough data for graph")
         self.show_main_buttons()
     
     def next_graph(self):
+        if not self.current_graph_type: # history is not loaded yet
+            return
         next_graph_type_index = (self.result_types.index(self.current_graph_type) + 1) % len(self.result_types)
         self.current_graph_type = self.result_types[next_graph_type_index]
         self.show_graph()
 
     def previous_graph(self):
+        if not self.current_graph_type: # history is not loaded yet
+            return
         next_graph_type_index = (self.result_types.index(self.current_graph_type) - 1) % len(self.result_types)
         self.current_graph_type = self.result_types[next_graph_type_index]
         self.show_graph()
 
 
+# history statistics shown in summary, run in history worker
+def get_history_stats(gamemode):
+    return {
+        "counts": {type: history.get_aggregates(gamemode, type)["Count"] for type in history.get_result_types(gamemode)},
+        "percentiles": history.get_percentiles(gamemode, "Response"),
+        "revision": history.get_revision(gamemode)
+    }
+
+# sorted and downsampled series of graph, run in history worker
+def get_graph_data(gamemode, type, width):
+    return prepare_graph_data(history.get_selected_results(gamemode, type), width)
+
+
 class Settings(StaticButtons):
     def __init__(self, screen, game):
         self.screen = screen
         self.game = game
         self.buttons = []
         self.font_size = SETTINGS.Appearance.settings_fontsize
-        self.font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.font_size)
+        self.font = get_font(self.font_size)
         self.slider_font_size = SETTINGS.Appearance.slider_fontsize
         self.buttons_font_size = SETTINGS.Appearance.settings_buttons_fontsize
         self.buttons_padding = SETTINGS.Appearance.buttons_padding
+        self.tab_view = None
         self.return_button = None
         self.sliders = []
 
-    def load(self):
-        # prepare
-        self.screen.fill(SETTINGS.Appearance.summary_bg_color)
-        
+    def prepare(self):
+        if self.tab_view:
+            return
         # create TabView
         self.tab_view = TabView(self.screen,
                              SETTINGS.Appearance.tab_view_bg_color, 
                              SETTINGS.Appearance.tab_selected_color,
                              SETTINGS.Appearance.tab_font_color, 
                              SETTINGS.Appearance.tab_fontsize, 
-                             ["Arcade", "SpeedyFingers", "AWP"], [self.show_settings]*3, 10, (0, 0, 600, 500))
+                             ["Arcade", "SpeedyFingers", "AWP", "Swarm"], [self.show_settings]*4, 10, (0, 0, 600, 500))
         self.tab_view.center = self.screen.get_rect().center
+        self.buttons.extend(self.tab_view.get_tab_buttons())
+
+    def load(self):
+        # prepare
+        self.prepare()
+        self.screen.fill(SETTINGS.Appearance.summary_bg_color)
         self.tab_view.draw()
-        self.buttons.extend(self.tab_view.tab_buttons)
 
         # show stats
         self.show_settings()
 
     def show_main_buttons(self):
         midbottom = self.tab_view.midbottom 
-        button_font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.buttons_font_size)
+        button_font = get_font(self.buttons_font_size)
         if not self.return_button:
-            return_rect = self.font.get_rect("Return", size=self.buttons_font_size) 
+            return_rect = text_cache.get_rect(self.font, "Return", self.buttons_font_size) 
             return_rect.center = midbottom
             return_rect.move_ip(0, -self.buttons_font_size)
             self.return_button = Button(self.screen, button_font, "Return", SETTINGS.Appearance.summary_color, self.buttons_padding, SETTINGS.Appearance.summary_color, 5, return_rect)
@@ -336,10 +579,10 @@ class Settings(StaticButtons):
     def show_settings(self):
         def show_variable(text, current_value, min_value, max_value, pos):
             var_text = f"{text}: {current_value}"
-            text_rect = self.font.get_rect(var_text, size=self.font_size) 
+            text_rect = text_cache.get_rect(self.font, var_text, self.font_size) 
             text_rect.center = pos
-            self.font.render_to(self.screen, text_rect, var_text, SETTINGS.Appearance.summary_color)
-            slider_font = pygame.freetype.Font(SETTINGS.Appearance.default_font, self.slider_font_size)
+            text_cache.render_to(self.screen, text_rect, self.font, var_text, SETTINGS.Appearance.summary_color, self.font_size)
+            slider_font = get_font(self.slider_font_size)
             slider = Slider(self.screen, SETTINGS.Appearance.tab_view_bg_color, 
                             slider_font, SETTINGS.Appearance.summary_color, 
                             self.slider_font_size, SETTINGS.Appearance.summary_color, 
@@ -352,13 +595,17 @@ class Settings(StaticButtons):
             self.buttons.append(slider.button)
             self.sliders.append(slider)
 
+        # remove sliders of previously shown tab
+        for slider in self.sliders:
+            self.buttons.remove(slider.button)
+        self.sliders = []
+
         gap = self.font_size * 4
         current_pos = self.tab_view.get_empty_rect().midtop
         current_pos = (current_pos[0], current_pos[1]-gap//2)
-        selected_game_mode = self.tab_view.selected_tab
-        for setting_name, value in vars(getattr(SETTINGS, selected_game_mode)).items():
-            min_value = SETTINGS.TargetLimits[setting_name][0]
-            max_value = SETTINGS.TargetLimits[setting_name][1]
+        game_mode_settings = getattr(SETTINGS, self.tab_view.selected_tab)
+        for setting_name, value in vars(game_mode_settings).items():
+            min_value, max_value = game_mode_settings.get_limits()[setting_name]
             current_pos = (current_pos[0], current_pos[1]+gap)
             show_variable(setting_name, value, min_value, max_value, current_pos)
         self.show_main_buttons()
@@ -368,145 +615,237 @@ class Settings(StaticButtons):
         setattr(game_mode_settings, setting_name, value) # how to show updated value?
         game_mode_settings.save_settings()
 
-    def frame(self):
-        super().frame()
+    def frame(self, frame_time=None):
+        super().frame(frame_time)
         for slider in self.sliders:
             slider.check_slider()
+        settings_store.flush_if_idle()
+        frame_profiler.mark("update")
 
 
 class Arcade(ShootingMode):
     def __init__(self, screen, game):
         super().__init__(screen, game)
 
+    def get_settings(self):
+        return SETTINGS.Arcade
+
     def load(self):
-        pygame.time.set_timer(self.game.events["ADD_TARGET"], 0)
-        pygame.time.set_timer(self.game.events["ADD_TARGET"], int(1000/SETTINGS.Arcade.spawn_rate))
+        self.prepare()
         self.add_target()
+        self.spawn_time_left = 1000/SETTINGS.Arcade.spawn_rate # miliseconds to next spawn
 
-    def frame(self):
-        self.screen.fill(SETTINGS.Appearance.background_color)
-        for event in pygame.event.get():
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                for target in self.targets:
-                    if target.mouse_collides(pygame.mouse.get_pos()):
-                        hit_sound.play()
-                        self.scoreCounter.add_hit()
-                        self.targets_to_delete.append(target)
-                        break
-                else:
-                    miss_sound.play()
-                self.scoreCounter.add_shoot()
-            elif event.type == self.game.events["ADD_TARGET"]:
-                self.add_target()
+    # targets are spawned and resized in simulation time, so spawn rate and duration don't depend on FPS
+    def step(self, delta_time):
+        super().step(delta_time)
+        self.spawn_time_left -= delta_time
+        while self.spawn_time_left <= 0:
+            self.add_target()
+            self.spawn_time_left += 1000/SETTINGS.Arcade.spawn_rate
+
+    # targets are counted when they disappear and spawned by timer
+    def on_target_hit(self, target):
+        pass
+
+    def frame(self, frame_time=None):
+        self.clear_screen()
                 
         # update targets size and draw
-        for target in self.targets:
-            if target.update(self.game.clock.get_time()) == False:
-                self.targets_to_delete.append(target)
+        alpha = self.simulate(frame_time)
+        frame_profiler.mark("update")
+        self.draw_targets(alpha)
+        frame_profiler.mark("draw")
 
         # delete unused targets
-        while len(self.targets_to_delete) > 0:
-            try:
-                self.targets.remove(self.targets_to_delete.pop())
-                self.scoreCounter.add_target()
-            except ValueError: # probably double clicked faster than delta time
-                pass
+        self.scoreCounter.add_target(self.remove_targets())
+        frame_profiler.mark("update")
         
         # update counter
-        self.scoreCounter.update()
+        self.update_counter()
+        frame_profiler.mark("hud")
     
     def add_target(self):
-        new_target = Target(self.screen, **SETTINGS.Arcade.get_target_settings(), forbidden_rects=self.get_occupied_rects())
-        self.targets.append(new_target)
+        self.spawn_target(self.get_settings())
 
 
 class SpeedyFingers(ShootingMode):
     def __init__(self, screen, game):
         super().__init__(screen, game)
 
+    def get_settings(self):
+        return SETTINGS.SpeedyFingers
+
     def load(self):
+        self.prepare()
         for i in range(SETTINGS.SpeedyFingers.targets_amount):
             self.add_target()
 
-    def frame(self):
-        self.screen.fill(SETTINGS.Appearance.background_color)
-        for event in pygame.event.get():
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                self.scoreCounter.add_shoot()
-                for target in self.targets:
-                    if target.mouse_collides(pygame.mouse.get_pos()):
-                        hit_sound.play()
-                        self.scoreCounter.add_hit()
-                        self.scoreCounter.add_target()
-                        self.targets_to_delete.append(target)
-                        pygame.event.post(pygame.event.Event(self.game.events["ADD_TARGET"]))
-                        break
-                else:
-                    miss_sound.play()
-            elif event.type == self.game.events["ADD_TARGET"]:
-                self.add_target()
+    def frame(self, frame_time=None):
+        self.clear_screen()
 
-        # draw targets
-        for target in self.targets:
-            target.draw()
+        # age targets and draw
+        alpha = self.simulate(frame_time)
+        frame_profiler.mark("update")
+        self.draw_targets(alpha)
+        frame_profiler.mark("draw")
         
         # delete unused targets
-        while len(self.targets_to_delete) > 0:
-            try:
-                self.targets.remove(self.targets_to_delete.pop())
-            except ValueError: # probably double clicked faster than delta time
-                pass 
+        self.remove_targets()
+        frame_profiler.mark("update")
         
         # update counter
-        self.scoreCounter.update()
+        self.update_counter()
+        frame_profiler.mark("hud")
 
     def add_target(self):
-        new_target = Target(self.screen, **SETTINGS.SpeedyFingers.get_target_settings(), forbidden_rects=self.get_occupied_rects())
-        self.targets.append(new_target)
+        self.spawn_target(self.get_settings())
 
 
 class AWP(ShootingMode):
     def __init__(self, screen, game):
         super().__init__(screen, game)
 
+    def get_settings(self):
+        return SETTINGS.AWP
+
     def load(self):
+        self.prepare()
         self.add_target()
 
-    def frame(self):
-        self.screen.fill(SETTINGS.Appearance.background_color)
-        for event in pygame.event.get():
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                self.scoreCounter.add_shoot()
-                for target in self.targets:
-                    if target.mouse_collides(pygame.mouse.get_pos()):
-                        hit_sound.play()
-                        self.scoreCounter.add_hit()
-                        self.scoreCounter.add_target()
-                        self.targets_to_delete.append(target)
-                        pygame.event.post(pygame.event.Event(self.game.events["ADD_TARGET"]))
-                        break
-                else:
-                    miss_sound.play()
-            elif event.type == self.game.events["ADD_TARGET"]:
-                self.add_target()
+    def frame(self, frame_time=None):
+        self.clear_screen()
 
-        # draw targets
-        for target in self.targets:
-            target.draw()
+        # age targets and draw
+        alpha = self.simulate(frame_time)
+        frame_profiler.mark("update")
+        self.draw_targets(alpha)
+        frame_profiler.mark("draw")
         
         # delete unused targets
-        while len(self.targets_to_delete) > 0:
-            try:
-                self.targets.remove(self.targets_to_delete.pop())
-            except ValueError: # probably double clicked faster than delta time
-                pass 
+        self.remove_targets()
+        frame_profiler.mark("update")
         
         # update counter
-        self.scoreCounter.update()
+        self.update_counter()
+        frame_profiler.mark("hud")
+
+    def add_target(self):
+        self.spawn_target(self.get_settings())
+
+
+SWARM_FILL = 0.9 # part of spawn positions taken by targets at once
+
+
+# Thousands of small targets on screen at once. Every target takes one position (slot) from pool,
+# positions in pool don't overlap, so targets are spawned without searching free space.
+# After first frame only hit and new targets are drawn or erased.
+class Swarm(SpeedyFingers):
+    def __init__(self, screen, game):
+        super().__init__(screen, game)
+        self.positions = None # pool without positions under score counter
+
+    def get_settings(self):
+        return SETTINGS.Swarm
+
+    # targets in pool positions can't touch
+    def get_spawn_positions(self, wait=True):
+        radius = self.get_settings().max_radius
+        return get_spawn_positions(SETTINGS.SCREEN_WIDTH, SETTINGS.SCREEN_HEIGHT, radius, radius*2+1, wait=wait)
+
+    # whole screen can't be searched for thousands of targets, so the first round waits
+    # for pool if it wasn't generated yet when game mode was prepared
+    def get_target_positions(self):
+        radius = self.get_settings().max_radius
+        positions = self.get_spawn_positions()
+        hud_bottom = SETTINGS.Appearance.score_fontsize + 10 # score counter is never drawn over targets
+        return positions[positions[:, 1] - radius > hud_bottom]
+
+    def reset(self):
+        super().reset()
+        self.free_slots = deque() # indices of unused positions in order of spawning
+        self.slots = {} # target position: index of position
+        self.new_targets = [] # positions of targets spawned since last frame
+        self.changed_rects = [] # drawn or erased targets, not cleared in next frame
+
+    def load(self):
+        self.prepare()
+        self.positions = self.get_target_positions()
+        start = self.rng.randrange(len(self.positions))
+        self.free_slots.extend(range(start, len(self.positions)))
+        self.free_slots.extend(range(start))
+        # some positions are always free, so hit target doesn't respawn at the same place
+        self.spawn_targets(min(SETTINGS.Swarm.swarm_size, int(len(self.positions)*SWARM_FILL)))
+
+    # spawn many targets at once, returns number of spawned targets
+    def spawn_targets(self, amount):
+        amount = min(amount, len(self.free_slots))
+        slots = [self.free_slots.popleft() for i in range(amount)]
+        positions = self.positions[slots].tolist()
+        self.targets.add_many(positions, **self.get_settings().get_target_settings())
+        for slot, (x, y) in zip(slots, positions):
+            self.slots[(x, y)] = slot
+            session_recorder.record(recording.SPAWN, x=x, y=y)
+        return amount
 
     def add_target(self):
-        new_target = Target(self.screen, **SETTINGS.AWP.get_target_settings())
-        self.targets.append(new_target) 
+        if self.spawn_targets(1):
+            self.new_targets.append(self.targets.get_pos(len(self.targets)-1))
+
+    def frame(self, frame_time=None):
+        full_redraw = self.full_redraw or not SETTINGS.DIRTY_RECTS
+        self.clear_screen() # erases only score counter if not full redraw
+
+        # age targets and draw
+        self.simulate(frame_time)
+        frame_profiler.mark("update")
+        if full_redraw:
+            self.targets.draw(self.screen)
+        else:
+            self.draw_new_targets()
+        self.new_targets = []
+        frame_profiler.mark("draw")
+
+        # erase hit targets and delete them
+        self.remove_targets()
+        frame_profiler.mark("update")
+
+        # update counter
+        self.update_counter()
+        frame_profiler.mark("hud")
+
+    def draw_new_targets(self):
+        self.changed_rects.extend(self.blit_targets(self.new_targets))
+
+    # all targets have the same sprite, returns touched rects
+    def blit_targets(self, positions):
+        settings = self.get_settings()
+        sprite = target_sprites.get(settings.max_radius, settings.outline_margin)
+        radius = settings.max_radius
+        return self.screen.blits([(sprite, (x-radius, y-radius)) for x, y in positions])
+
+    # erase hit targets and return their positions to pool. Squares of near targets overlap,
+    # so parts of remaining targets inside erased squares are drawn again.
+    def remove_targets(self):
+        indices = set(self.targets_to_delete)
+        erased_rects = []
+        for i in indices:
+            erased_rects.append(self.screen.fill(SETTINGS.Appearance.background_color, self.targets.get_final_rect(i)))
+            self.free_slots.append(self.slots.pop(self.targets.get_pos(i)))
+        for rect in erased_rects:
+            self.screen.set_clip(rect)
+            self.blit_targets([self.targets.get_pos(j) for j in self.targets.get_colliding(rect) if j not in indices])
+        self.screen.set_clip(None)
+        self.changed_rects.extend(erased_rects)
+        self.targets_to_delete = []
+        return self.targets.remove(indices)
+
+    def get_dirty_rects(self):
+        changed_rects = self.changed_rects
+        self.changed_rects = []
+        dirty_rects = super().get_dirty_rects()
+        if dirty_rects is None:
+            return None
+        return dirty_rects + changed_rects
 
 
 # TO INSPECT:
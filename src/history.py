@@ -1,6 +1,12 @@
 import pathlib
 import json
 import time
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from collections import deque
+from sketches import TDigest, digest_from_dict
 
 # RESULTS STRUCTURE
 # {
@@ -8,55 +14,284 @@ import time
 #   {
 #       DATE:
 #       {
-#           RESULTS...      
+#           RESULTS...
 #       }
 #   }
 #   ...
 # }
 
+# HISTORY FILE STRUCTURE
+# append-only log, one round per line:
+# {"mode": GAMEMODE, "date": DATE, "results": {RESULTS...}, "sketches": {TYPE: TDIGEST...}}
+# (sketches of reaction times are saved since they were added)
+
 results = {
 }
 
+# COLUMNS STRUCTURE
+# {
+#   GAMEMODE:
+#   {
+#       RESULT TYPE: ResultColumn
+#   }
+# }
+
+columns = {
+}
+
+revisions = { # incremented when new results of game mode are added
+}
+
+# SKETCHES STRUCTURE
+# round_sketches: {GAMEMODE: {DATE: {TYPE: TDIGEST DICT}}}
+# sketches: {GAMEMODE: {TYPE: TDigest of all rounds}}
+
+round_sketches = {
+}
+
+sketches = {
+}
+
+loaded = False # history file is read on first use or in background by load_history_in_background()
+load_lock = threading.Lock()
+load_time = None # seconds spent on reading history
+worker = ThreadPoolExecutor(max_workers=1) # jobs run one by one in order of submitting, see run_in_background
+
+LOWER_IS_BETTER = ["Median response", "Median spawn response"]
+ROLLING_WINDOW = 10 # rounds
+
+HISTORY_PATH = pathlib.Path.home() / "pyaimbooster.history"
+OLD_HISTORY_PATH = pathlib.Path.home() / "pyaimbooster.stats" # json dump of whole results
+
+
+# Results of one type kept in date order with aggregates updated on every new result
+class ResultColumn():
+    def __init__(self, lower_is_better=False, rolling_window=ROLLING_WINDOW):
+        self.dates = array("q")
+        self.values = array("d")
+        self.lower_is_better = lower_is_better
+        self.total = 0.0
+        self.best = None
+        self.rolling_values = deque(maxlen=rolling_window)
+        self.rolling_total = 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, date, value):
+        self.dates.append(int(date))
+        self.values.append(value)
+        self.total += value
+        if self.best is None or (value < self.best if self.lower_is_better else value > self.best):
+            self.best = value
+        if len(self.rolling_values) == self.rolling_values.maxlen:
+            self.rolling_total -= self.rolling_values[0]
+        self.rolling_values.append(value)
+        self.rolling_total += value
+
+    def get_mean(self):
+        if len(self.values) == 0:
+            return 0
+        return self.total / len(self.values)
+
+    # mean of last ROLLING_WINDOW results
+    def get_rolling_mean(self):
+        if len(self.rolling_values) == 0:
+            return 0
+        return self.rolling_total / len(self.rolling_values)
+
+    def get_aggregates(self):
+        return {
+            "Count": len(self.values),
+            "Best": self.best,
+            "Mean": self.get_mean(),
+            "Rolling mean": self.get_rolling_mean()
+        }
+
+    # returns list of (date, value) tuples, e.g. last 100 results with start=-100
+    def get_slice(self, start=None, stop=None):
+        return list(zip(self.dates[start:stop], self.values[start:stop]))
+
+
+def add_to_columns(gamemode, date, stats):
+    gamemode_columns = columns.setdefault(gamemode, {})
+    for type, value in stats.items():
+        if not type in gamemode_columns:
+            gamemode_columns[type] = ResultColumn(type in LOWER_IS_BETTER)
+        gamemode_columns[type].add(date, value)
+
+def build_columns(history):
+    columns.clear()
+    for gamemode, gamemode_results in history.items():
+        dates = list(gamemode_results)
+        # log is written in date order, sorting (which blocks other threads) is needed e.g. after migration
+        if any(int(dates[i]) > int(dates[i+1]) for i in range(len(dates)-1)):
+            dates.sort(key=int)
+        for date in dates:
+            add_to_columns(gamemode, date, gamemode_results[date])
+
+def add_to_sketches(gamemode, gamemode_sketches):
+    for type, digest in gamemode_sketches.items():
+        sketches.setdefault(gamemode, {}).setdefault(type, TDigest()).merge(digest_from_dict(digest))
+
+def build_sketches(history_sketches):
+    sketches.clear()
+    for gamemode, dates in history_sketches.items():
+        for gamemode_sketches in dates.values():
+            add_to_sketches(gamemode, gamemode_sketches)
+
+def make_record(gamemode, date, stats, record_sketches=None):
+    record = {"mode": gamemode, "date": date, "results": stats}
+    if record_sketches:
+        record["sketches"] = record_sketches
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+# centroids are kept as tuples of numbers, which garbage collector stops tracking,
+# so collections don't have to scan lists of every round in history
+def untrack_sketches(record_sketches):
+    for digest in record_sketches.values():
+        digest["centroids"] = tuple(map(tuple, digest["centroids"]))
+    return record_sketches
+
+# returns results and sketches of rounds
 def read_history():
-    file_path = pathlib.Path.home() / "pyaimbooster.stats"
-    file_path.touch(exist_ok=True)
-    with file_path.open("r", encoding="utf-8") as f:
+    if not HISTORY_PATH.exists():
+        migrate_old_history()
+    history = {}
+    history_sketches = {}
+    damaged = False
+    HISTORY_PATH.touch(exist_ok=True)
+    with HISTORY_PATH.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                history.setdefault(record["mode"], {})[record["date"]] = record["results"]
+                if "sketches" in record:
+                    history_sketches.setdefault(record["mode"], {})[record["date"]] = untrack_sketches(record["sketches"])
+            except (ValueError, KeyError, TypeError, AttributeError): # e.g. partially written line after crash
+                damaged = True
+    if damaged:
+        compact_history(history, history_sketches)
+    return history, history_sketches
+
+def load_history():
+    global loaded, load_time
+    if loaded:
+        return
+    with load_lock: # wait for background loading
+        if loaded:
+            return
+        start = time.perf_counter()
+        history, history_sketches = read_history()
+        results.update(history)
+        round_sketches.update(history_sketches)
+        build_columns(results)
+        build_sketches(round_sketches)
+        load_time = time.perf_counter() - start
+        loaded = True
+
+def load_history_in_background():
+    threading.Thread(target=load_history, daemon=True).start()
+
+def is_loaded():
+    return loaded
+
+# Run function in history worker, returns Future. History is changed only by worker
+# (or before it is started), so job submitted after add_results sees new results.
+def run_in_background(function, *args):
+    return worker.submit(function, *args)
+
+# rewrite whole log from given results, file is replaced atomically
+def compact_history(history=None, history_sketches=None):
+    if history is None:
+        load_history()
+        history = results
+    if history_sketches is None:
+        history_sketches = round_sketches
+    tmp_path = HISTORY_PATH.with_name(HISTORY_PATH.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        for gamemode, gamemode_results in history.items():
+            for date, stats in gamemode_results.items():
+                f.write(make_record(gamemode, date, stats, history_sketches.get(gamemode, {}).get(date)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, HISTORY_PATH)
+
+# convert results saved by older versions as one json file
+def migrate_old_history():
+    if not OLD_HISTORY_PATH.exists():
+        return
+    with OLD_HISTORY_PATH.open("r", encoding="utf-8") as f:
         try:
-            history = json.load(f)
-        except: # invalid file
-            return {}
-    return history
-
-def write_history():
-    file_path = pathlib.Path.home() / "pyaimbooster.stats"
-    file_path.touch(exist_ok=True)
-    with file_path.open("w", encoding="utf-8") as f:
-        json.dump(results, f, indent=4)
-
-def add_results(gamemode, new_stats):
+            old_history = json.load(f)
+        except ValueError: # invalid file
+            return
+    compact_history(old_history, {})
+
+def append_history(gamemode, date, stats, new_sketches=None):
+    with HISTORY_PATH.open("a", encoding="utf-8") as f:
+        f.write(make_record(gamemode, date, stats, new_sketches))
+        f.flush()
+        os.fsync(f.fileno())
+
+# new_sketches - {TYPE: TDigest} of round, e.g. all reaction times
+# results are saved in history worker, so end of round doesn't wait for reading and writing history
+def add_results(gamemode, new_stats, new_sketches=None):
+    date = str(int(time.time()))
+    if new_sketches: # copied now, digests of round are still used by game
+        new_sketches = {type: digest.to_dict() for type, digest in new_sketches.items()}
+    return run_in_background(store_results, gamemode, date, dict(new_stats), new_sketches)
+
+def store_results(gamemode, date, new_stats, new_sketches=None):
+    load_history()
     if not gamemode in results:
         results[gamemode] = {}
-    results[gamemode][str(int(time.time()))] = new_stats
-    write_history()
+    # date is key of round, so round saved in the same second as previous one gets next free second
+    while date in results[gamemode]:
+        date = str(int(date) + 1)
+    results[gamemode][date] = new_stats
+    add_to_columns(gamemode, date, new_stats)
+    revisions[gamemode] = get_revision(gamemode) + 1
+    if new_sketches:
+        round_sketches.setdefault(gamemode, {})[date] = new_sketches
+        add_to_sketches(gamemode, new_sketches)
+    append_history(gamemode, date, new_stats, new_sketches)
 
 # returns list of tuples which containts time and particular result values
-# e.g. for ("AWP", "Hits") returns (("12312425", "40"), ("12315425", "35"))
-def get_selected_results(gamemode, type):
-    selected_results = []
-    if gamemode in results:
-        for time, gamemode_results in results[gamemode].items():
-            if type in gamemode_results:
-                selected_results.append((time, gamemode_results[type]))
-    return selected_results
+# e.g. for ("AWP", "Hits") returns ((12312425, 40), (12315425, 35))
+def get_selected_results(gamemode, type, start=None, stop=None):
+    column = get_column(gamemode, type)
+    if column is None:
+        return []
+    return column.get_slice(start, stop)
 
-def get_result_types(gamemode):
-    result_types = []
-    if gamemode in results:
-        for time, gamemode_results in results[gamemode].items():
-            for type in gamemode_results:
-                result_types.append(type)
-            break # we only need one iteration to get each of result type
-    return result_types
+def get_column(gamemode, type):
+    load_history()
+    return columns.get(gamemode, {}).get(type)
+
+# returns count, best, mean and rolling mean of result type
+def get_aggregates(gamemode, type):
+    column = get_column(gamemode, type)
+    if column is None:
+        return ResultColumn().get_aggregates()
+    return column.get_aggregates()
 
+def get_revision(gamemode):
+    load_history()
+    return revisions.get(gamemode, 0)
+
+def get_result_types(gamemode):
+    load_history()
+    return list(columns.get(gamemode, {}))
 
-results = read_history()
+# returns p50, p90, p99, mean and variance of all rounds or rounds since date (unix time)
+def get_percentiles(gamemode, type, since=None):
+    load_history()
+    if since is None:
+        digest = sketches.get(gamemode, {}).get(type, TDigest())
+    else:
+        digest = TDigest()
+        for date, gamemode_sketches in round_sketches.get(gamemode, {}).items():
+            if int(date) >= since and type in gamemode_sketches:
+                digest.merge(digest_from_dict(gamemode_sketches[type]))
+    return digest.get_stats()
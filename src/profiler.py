@@ -0,0 +1,196 @@
+import time
+import pathlib
+import pygame
+from collections import deque
+from config import SETTINGS
+from fonts import get_font
+from sounds import channel_pool
+
+
+# phases of one frame in order of execution
+PHASES = ["events", "update", "draw", "hud", "display", "wait"]
+
+
+def percentile(sorted_data, percent):
+    if not sorted_data:
+        return 0
+    index = min(len(sorted_data)-1, int(round(percent/100*(len(sorted_data)-1))))
+    return sorted_data[index]
+
+
+# Measures time spent in each phase of frame. Code between marks is counted
+# to phase given in following mark, e.g. mark("draw") after drawing targets.
+class FrameProfiler():
+    def __init__(self, window=1000, overlay_interval=0.25, trace_limit=100000):
+        self.window = window # number of last frames used for statistics
+        self.frame_times = deque(maxlen=window)
+        self.phase_times = {phase: deque(maxlen=window) for phase in PHASES}
+        self.current_phases = dict.fromkeys(PHASES, 0.0)
+        self.frame_start = None
+        self.last_mark = None
+        self.frames = 0
+        self.trace = None # last frames when tracing
+        self.trace_limit = trace_limit # frames kept in trace, ~11 minutes at 144 FPS
+        self.trace_path = None # file of last saved trace
+        self.overlay_visible = False
+        self.overlay_interval = overlay_interval # seconds between overlay refreshes
+        self.overlay = None
+        self.overlay_time = 0
+        self.font = None
+
+    def begin_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter()
+        self.current_phases = dict.fromkeys(PHASES, 0.0)
+
+    # add time since last mark to phase, ignored outside of frame
+    def mark(self, phase):
+        if self.last_mark is None:
+            return
+        now = time.perf_counter()
+        self.current_phases[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        frame_time = time.perf_counter() - self.frame_start
+        self.frame_times.append(frame_time)
+        for phase, phase_time in self.current_phases.items():
+            self.phase_times[phase].append(phase_time)
+        if self.trace is not None:
+            self.trace.append((self.frames, self.frame_start, frame_time, *self.current_phases.values()))
+        self.frames += 1
+        self.frame_start = self.last_mark = None
+
+    def reset(self):
+        self.frame_times.clear()
+        for phase_times in self.phase_times.values():
+            phase_times.clear()
+
+    # returns p50/p95/p99/worst in miliseconds for whole frame and each phase
+    def get_stats(self):
+        def describe(times):
+            times = sorted(times)
+            return {
+                "p50_ms": percentile(times, 50)*1000,
+                "p95_ms": percentile(times, 95)*1000,
+                "p99_ms": percentile(times, 99)*1000,
+                "max_ms": (times[-1] if times else 0)*1000
+            }
+        stats = {"frame": describe(self.frame_times)}
+        for phase, phase_times in self.phase_times.items():
+            stats[phase] = describe(phase_times)
+        return stats
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay = None
+
+    # returns surface with statistics, rendered again every overlay_interval
+    def get_overlay(self):
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_time > self.overlay_interval:
+            self.overlay = self.render_overlay()
+            self.overlay_time = now
+        return self.overlay
+
+    def render_overlay(self):
+        font_size = SETTINGS.Appearance.profiler_fontsize
+        if self.font is None:
+            self.font = get_font(font_size)
+        rows = [["ms", "p50", "p95", "p99", "worst"]]
+        for name, stats in self.get_stats().items():
+            rows.append([name] + [f"{value:.2f}" for value in stats.values()])
+        latencies = channel_pool.latencies
+        if latencies.count: # click to sound
+            rows.append(["audio"] + [f"{value:.2f}" for value in (latencies.quantile(0.5), latencies.quantile(0.95), latencies.quantile(0.99), latencies.max)])
+        status = self.get_trace_status()
+        padding = 5
+        line_height = font_size + 2
+        name_width = font_size*5
+        column_width = font_size*4
+        lines = len(rows) + (status is not None)
+        overlay = pygame.Surface((name_width + column_width*4 + padding*2, line_height*lines + padding*2))
+        overlay.fill(SETTINGS.Appearance.profiler_bg_color)
+        if status is not None:
+            self.font.render_to(overlay, (padding, padding + line_height*len(rows)), status, SETTINGS.Appearance.profiler_color)
+        for i, (name, *values) in enumerate(rows):
+            y = padding + i*line_height
+            self.font.render_to(overlay, (padding, y), name, SETTINGS.Appearance.profiler_color)
+            for j, value in enumerate(values):
+                # align values to right side of column
+                text_rect = self.font.get_rect(value, size=font_size)
+                text_rect.topright = (padding + name_width + column_width*(j+1), y)
+                self.font.render_to(overlay, text_rect, value, SETTINGS.Appearance.profiler_color)
+        return overlay
+
+    # shown under statistics instead of printing
+    def get_trace_status(self):
+        if self.is_tracing():
+            return f"tracing, {len(self.trace)} frames"
+        if self.trace_path is not None:
+            return f"trace saved to {self.trace_path.name}"
+        return None
+
+    def is_tracing(self):
+        return self.trace is not None
+
+    def start_trace(self):
+        self.trace = deque(maxlen=self.trace_limit)
+
+    # write traced frames as csv, returns path of file
+    def stop_trace(self, file_path=None):
+        if file_path is None:
+            file_path = pathlib.Path.home() / f"pyaimbooster_trace_{int(time.time())}.csv"
+        file_path = pathlib.Path(file_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(",".join(["frame", "start_s", "frame_ms"] + [phase + "_ms" for phase in PHASES]) + "\n")
+            for frame, start, *times in self.trace:
+                f.write(f"{frame},{start:.6f}," + ",".join(f"{t*1000:.4f}" for t in times) + "\n")
+        self.trace = None
+        self.trace_path = file_path
+        return file_path
+
+
+# Time spent in phases of startup, measured from start_time given to begin
+# (e.g. before imports) and printed by --profile-startup
+class StartupProfiler():
+    def __init__(self):
+        self.start_time = None
+        self.last_mark = None
+        self.phases = [] # (phase, seconds spent, seconds since start)
+
+    def begin(self, start_time=None):
+        self.start_time = self.last_mark = start_time or time.perf_counter()
+        self.phases = []
+
+    # add time since last mark to phase
+    def mark(self, phase):
+        if self.start_time is None:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_mark, now - self.start_time))
+        self.last_mark = now
+
+    # add phase which was not measured from last mark, e.g. done in background thread
+    def add(self, phase, duration):
+        if self.start_time is None:
+            return
+        self.phases.append((phase, duration, time.perf_counter() - self.start_time))
+
+    # run function and add its time as phase
+    def measure(self, phase, function):
+        start = time.perf_counter()
+        function()
+        self.add(phase, time.perf_counter() - start)
+        self.last_mark = time.perf_counter()
+
+    def report(self):
+        lines = [f"{'phase':<24}{'ms':>10}{'since start ms':>16}"]
+        for phase, duration, since_start in self.phases:
+            lines.append(f"{phase:<24}{duration*1000:>10.1f}{since_start*1000:>16.1f}")
+        return "\n".join(lines)
+
+
+frame_profiler = FrameProfiler()
+startup_profiler = StartupProfiler()
@@ -0,0 +1,189 @@
+import json
+import time
+import zlib
+import struct
+import random
+import pygame
+from config import SETTINGS
+from sounds import channel_pool
+
+# SESSION FILE STRUCTURE
+# MAGIC, header length (uint32), json header {"mode", "seed", "settings", "date"},
+# zlib compressed records, each record is (type, value, x, y) packed as RECORD
+
+MAGIC = b"PYAB\x01"
+RECORD = struct.Struct("<Bdhh")
+
+# record types
+FRAME = 0 # value - frame time in miliseconds
+PUMP = 1 # value - seconds since session start when events were taken from queue
+CLICK = 2 # x, y - position of click
+ADD_TARGET = 3 # add target event handled by game mode
+SPAWN = 4 # x, y - center of spawned target
+SHOWN = 5 # value - seconds since session start of display update
+
+# global settings which change gameplay, saved with settings of game mode
+GLOBAL_SETTINGS = ["SCREEN_WIDTH", "SCREEN_HEIGHT", "SIM_STEP", "MAX_SIM_STEPS", "CHALLENGE_TIME"]
+
+
+# Records everything needed to play shooting mode round again: seed of spawn positions,
+# settings, input and spawn events. Records are kept in memory and written when round ends.
+class SessionRecorder():
+    def __init__(self):
+        self.header = None
+        self.records = None
+        self.start_time = 0
+        self.next_seed = None # seed of next session, e.g. when replaying
+        self.next_spawn_pool = None # whether next session spawns targets from pool, None if pool is used when ready
+
+    def is_recording(self):
+        return self.records is not None
+
+    # returns seed of spawn positions, the same seed and input give the same targets
+    # spawn_pool - targets are spawned from pool, otherwise free space is searched on whole screen
+    def start(self, game_mode, mode_settings, start_time, spawn_pool=True):
+        seed = self.next_seed
+        self.next_seed = None
+        self.next_spawn_pool = None
+        if seed is None:
+            seed = random.randrange(2**32)
+        settings = {name: getattr(SETTINGS, name) for name in GLOBAL_SETTINGS}
+        settings[type(mode_settings).__name__] = dict(vars(mode_settings))
+        self.header = {"mode": game_mode, "seed": seed, "spawn_pool": spawn_pool, "settings": settings, "date": int(time.time())}
+        self.records = bytearray()
+        self.start_time = start_time
+        return seed
+
+    def record(self, type, value=0.0, x=0, y=0):
+        if self.records is not None:
+            self.records += RECORD.pack(type, value, x, y)
+
+    def record_time(self, type, t):
+        self.record(type, t - self.start_time)
+
+    # returns path of written file or None if nothing was saved
+    def stop(self, file_path=None):
+        if self.records is None:
+            return None
+        header, records = self.discard()
+        if not SETTINGS.RECORD_SESSIONS:
+            return None
+        if file_path is None:
+            SETTINGS.SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+            file_path = SETTINGS.SESSIONS_DIR / f"{header['mode'].replace(' ', '_')}_{int(time.time()*1000)}.pab"
+        write_session(file_path, header, records)
+        return file_path
+
+    # stop without writing, returns header and records
+    def discard(self):
+        session = self.header, bytes(self.records or b"")
+        self.header = self.records = None
+        return session
+
+
+def write_session(file_path, header, records):
+    header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    with open(file_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header + zlib.compress(records, 9))
+
+# returns header and list of records
+def read_session(file_path):
+    with open(file_path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{file_path} is not session file")
+    offset = len(MAGIC)
+    header_length, = struct.unpack_from("<I", data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset+header_length].decode("utf-8"))
+    records = zlib.decompress(data[offset+header_length:])
+    return header, list(RECORD.iter_unpack(records))
+
+def get_spawns(records):
+    return [(x, y) for type, value, x, y in records if type == SPAWN]
+
+
+# Runs recorded round through game mode again. Without visible window frames are not
+# waited for, so replay is limited only by simulation speed. Returns replayed round statistics.
+def replay_session(game, header, records, speed=None):
+    previous_settings = apply_settings(header["settings"])
+    previous_record_sessions = SETTINGS.RECORD_SESSIONS
+    previous_save_telemetry = SETTINGS.SAVE_TELEMETRY
+    SETTINGS.RECORD_SESSIONS = False # replay is recorded only in memory to compare spawns
+    SETTINGS.SAVE_TELEMETRY = False
+    previous_latencies = channel_pool.latencies
+    channel_pool.reset_stats() # click times are from recording, so measured delays are meaningless
+    try:
+        game.set_challenge(False) # end of challenge is end of records
+        session_recorder.next_seed = header["seed"]
+        session_recorder.next_spawn_pool = header.get("spawn_pool", True)
+        game.change_game_mode(header["mode"]) # spawns first targets from seed
+        mode = game.game_mode_obj
+        dispatcher = game.event_dispatcher
+        base_time = game.scoreCounter.start_time
+        start = time.perf_counter()
+        for type, value, x, y in records:
+            if type == PUMP:
+                dispatcher.previous_pump_time = dispatcher.pump_time
+                dispatcher.pump_time = base_time + value
+            elif type == CLICK:
+                mode.on_click(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(x, y), button=1))
+            elif type == ADD_TARGET:
+                mode.on_add_target(None)
+            elif type == FRAME:
+                pygame.event.clear() # events posted by game mode are replayed from records
+                mode.frame(value)
+                dirty_rects = mode.get_dirty_rects() # game mode expects display update after frame
+                if speed:
+                    # shown time is taken from records, so display_updated is not called
+                    if dirty_rects is None:
+                        pygame.display.update()
+                    else:
+                        pygame.display.update(dirty_rects)
+                    time.sleep(value/1000/speed)
+            elif type == SHOWN:
+                mode.display_updated(base_time + value)
+        elapsed = time.perf_counter() - start
+        replayed_spawns = get_spawns(RECORD.iter_unpack(session_recorder.discard()[1]))
+    finally:
+        SETTINGS.RECORD_SESSIONS = previous_record_sessions
+        SETTINGS.SAVE_TELEMETRY = previous_save_telemetry
+        channel_pool.latencies = previous_latencies
+        restore_settings(previous_settings)
+    recorded_spawns = get_spawns(records)
+    score_counter = game.scoreCounter
+    return {
+        "mode": header["mode"],
+        "hits": score_counter.get_hits(),
+        "targets": score_counter.get_all_targets(),
+        "accuracy": score_counter.get_accuracy(),
+        "median_response": score_counter.get_median_reaction_time(),
+        "median_spawn_response": score_counter.get_median_spawn_reaction_time(),
+        "session_time": sum(value for type, value, x, y in records if type == FRAME)/1000,
+        "replay_time": elapsed,
+        # spawn positions which differ from recorded ones, should be 0
+        "desyncs": sum(a != b for a, b in zip(recorded_spawns, replayed_spawns)) + abs(len(recorded_spawns) - len(replayed_spawns)),
+    }
+
+# set settings from session, returns previous values
+def apply_settings(settings):
+    previous_settings = {}
+    for name, value in settings.items():
+        if isinstance(value, dict):
+            mode_settings = getattr(SETTINGS, name[:-len("Settings")])
+            previous_settings[name] = dict(vars(mode_settings))
+            vars(mode_settings).update(value)
+        else:
+            previous_settings[name] = getattr(SETTINGS, name)
+            setattr(SETTINGS, name, value)
+    return previous_settings
+
+def restore_settings(previous_settings):
+    for name, value in previous_settings.items():
+        if isinstance(value, dict):
+            vars(getattr(SETTINGS, name[:-len("Settings")])).update(value)
+        else:
+            setattr(SETTINGS, name, value)
+
+
+session_recorder = SessionRecorder()
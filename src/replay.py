@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import argparse
+
+# run without window and sound card, must be set before pygame is initialized
+if "--visual" not in sys.argv:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import recording
+from aimbooster import Game
+from fonts import preload_fonts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded pyaimbooster session")
+    parser.add_argument("session")
+    parser.add_argument("--visual", action="store_true", help="show replay in window")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed of visual replay")
+    args = parser.parse_args(argv)
+
+    header, records = recording.read_session(args.session)
+    settings = header["settings"]
+    pygame.init()
+    screen = pygame.display.set_mode((settings["SCREEN_WIDTH"], settings["SCREEN_HEIGHT"]))
+    preload_fonts()
+    game = Game(screen)
+    stats = recording.replay_session(game, header, records, args.speed if args.visual else None)
+    pygame.quit()
+    print(json.dumps(stats, indent=4))
+    if stats["desyncs"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import math
+
+
+# Streaming quantile estimation (merging t-digest). Values are kept as centroids (mean, weight),
+# centroids near median are large and near tails are single values, so percentiles are accurate
+# with at most ~compression centroids. Digests of many rounds can be merged into one.
+class TDigest():
+    def __init__(self, compression=100, buffer_size=256):
+        self.compression = compression
+        self.buffer_size = buffer_size # values added before merging into centroids
+        self.means = []
+        self.weights = []
+        self.buffer = []
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from mean (Welford)
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return int(self.count)
+
+    def add(self, value, weight=1):
+        self.buffer.append((value, weight))
+        self.count += weight
+        delta = value - self.mean
+        self.mean += delta*weight/self.count
+        self.m2 += delta*(value - self.mean)*weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+
+    # merge buffered values and centroids, neighbours are joined while centroid stays under size limit
+    def compress(self):
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        self.buffer = []
+        means, weights = [], []
+        cumulative = 0
+        current_mean, current_weight = points[0]
+        for mean, weight in points[1:]:
+            new_weight = current_weight + weight
+            q = (cumulative + new_weight/2)/self.count
+            if new_weight <= 4*self.count*q*(1-q)/self.compression:
+                current_mean += (mean - current_mean)*weight/new_weight
+                current_weight = new_weight
+            else:
+                means.append(current_mean)
+                weights.append(current_weight)
+                cumulative += current_weight
+                current_mean, current_weight = mean, weight
+        means.append(current_mean)
+        weights.append(current_weight)
+        self.means, self.weights = means, weights
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        other.compress()
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta*delta*self.count*other.count/count
+        self.mean += delta*other.count/count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buffer.extend(zip(other.means, other.weights))
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+
+    # q from 0 to 1, values between centroids are interpolated
+    def quantile(self, q):
+        if self.count == 0:
+            return 0
+        self.compress()
+        target = q*self.count
+        cumulative = 0
+        previous_center, previous_mean = 0, self.min
+        for mean, weight in zip(self.means, self.weights):
+            center = cumulative + weight/2
+            if target < center:
+                if center == previous_center:
+                    return mean
+                return previous_mean + (mean - previous_mean)*(target - previous_center)/(center - previous_center)
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        if cumulative == previous_center:
+            return self.max
+        return previous_mean + (self.max - previous_mean)*(target - previous_center)/(cumulative - previous_center)
+
+    def get_variance(self):
+        if self.count == 0:
+            return 0
+        return self.m2/self.count
+
+    # returns p50, p90, p99, mean and variance
+    def get_stats(self):
+        return {
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "mean": self.mean,
+            "variance": self.get_variance()
+        }
+
+    def to_dict(self):
+        self.compress()
+        return {
+            "centroids": [[round(mean, 6), weight] for mean, weight in zip(self.means, self.weights)],
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            # infinities of empty digest are not valid json
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+
+def digest_from_dict(data):
+    digest = TDigest()
+    if data["count"] == 0:
+        return digest
+    for mean, weight in data["centroids"]:
+        digest.means.append(mean)
+        digest.weights.append(weight)
+    digest.count = data["count"]
+    digest.mean = data["mean"]
+    digest.m2 = data["m2"]
+    digest.min = data["min"]
+    digest.max = data["max"]
+    return digest
@@ -1,6 +1,103 @@
-import pygame.mixer
+import time
+import pygame
+from config import SETTINGS
+from sketches import TDigest
 
-pygame.mixer.init()
+DEFAULT_BUFFER = 512 # samples, pygame default used when low latency mode is off
 
-hit_sound = pygame.mixer.Sound("src/sounds/hit.wav")
-miss_sound = pygame.mixer.Sound("src/sounds/miss2.wav")
\ No newline at end of file
+
+# Sound file is decoded on first play or load call, so importing game doesn't open audio device
+class Sound():
+    def __init__(self, path):
+        self.path = path
+        self.sound = None
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if init_mixer():
+            self.sound = pygame.mixer.Sound(self.path)
+
+    # input_time - perf_counter time when click causing sound was taken from queue
+    def play(self, input_time=None):
+        self.load()
+        if self.sound:
+            channel_pool.play(self.sound, input_time)
+
+
+# Shot sounds are played only on channels reserved for them. When all channels are busy,
+# sound which started first is stopped and its channel is reused, so the newest click is always heard.
+class ChannelPool():
+    def __init__(self):
+        self.channels = []
+        self.start_times = []
+        self.buffer_latency = 0 # seconds of audio waiting in mixer buffer
+        self.stolen = 0 # sounds stopped to play newer ones
+        self.latencies = TDigest() # miliseconds from click to start of sound
+        self.latency_hook = None # called with every measured delay in miliseconds
+
+    def init(self, size, buffer_latency):
+        pygame.mixer.set_num_channels(max(size, pygame.mixer.get_num_channels()))
+        pygame.mixer.set_reserved(size)
+        self.channels = [pygame.mixer.Channel(i) for i in range(size)]
+        self.start_times = [0.0]*size
+        self.buffer_latency = buffer_latency
+
+    # index of free channel or of the oldest playing one
+    def get_channel(self):
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i
+        self.stolen += 1
+        return min(range(len(self.channels)), key=self.start_times.__getitem__)
+
+    def play(self, sound, input_time=None):
+        if not self.channels:
+            return
+        i = self.get_channel()
+        self.channels[i].play(sound) # stops sound playing on channel
+        now = time.perf_counter()
+        self.start_times[i] = now
+        if input_time is not None:
+            # sound starts at latest when mixer buffer filled after play call is sent to device
+            self.add_latency((now - input_time + self.buffer_latency)*1000)
+
+    def add_latency(self, latency):
+        self.latencies.add(latency)
+        if self.latency_hook is not None:
+            self.latency_hook(latency)
+
+    def reset_stats(self):
+        self.latencies = TDigest()
+        self.stolen = 0
+
+
+# mixer settings used by next pygame.init() or pygame.mixer.init()
+def pre_init_mixer():
+    audio = SETTINGS.Audio
+    pygame.mixer.pre_init(audio.frequency, -16, 2, audio.buffer if audio.low_latency else DEFAULT_BUFFER)
+
+# returns False if there is no audio device, game is played without sounds then
+def init_mixer():
+    if not pygame.mixer.get_init():
+        pre_init_mixer()
+        try:
+            pygame.mixer.init()
+        except pygame.error:
+            return False
+    if not channel_pool.channels:
+        audio = SETTINGS.Audio
+        buffer = audio.buffer if audio.low_latency else DEFAULT_BUFFER
+        channel_pool.init(audio.channels, buffer/pygame.mixer.get_init()[0])
+    return True
+
+def load_sounds():
+    for sound in (hit_sound, miss_sound):
+        sound.load()
+
+
+channel_pool = ChannelPool()
+hit_sound = Sound("src/sounds/hit.wav")
+miss_sound = Sound("src/sounds/miss2.wav")
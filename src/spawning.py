@@ -0,0 +1,175 @@
+import os
+import math
+import time
+import random
+import pathlib
+import pygame
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+POOLS_DIR = pathlib.Path.home() / "pyaimbooster_pools"
+MIN_POOL_DISTANCE = 10 # pixels between positions in pool of small targets
+MAX_POOL_TRIES = 64 # positions checked before searching whole grid
+
+spawn_positions = { # (width, height, radius, min_distance): positions array
+}
+
+pool_jobs = { # (width, height, radius, min_distance): Future of pool generated in background
+}
+pool_worker = ThreadPoolExecutor(max_workers=1) # pools are generated one by one, game thread doesn't wait for them
+
+
+# Uniform grid of occupied screen areas maintained incrementally as targets spawn and die.
+# Each cell stores how many target rects overlap it, so free space for a target
+# is found with one summed-area table over the grid instead of testing every target.
+class SpawnGrid():
+    def __init__(self, width, height, cell_size=10):
+        self.cell_size = cell_size
+        self.cols = width // cell_size
+        self.rows = height // cell_size
+        self.cells = np.zeros((self.rows, self.cols), dtype=np.int32)
+
+    # returns cell slices covered by rect, clipped to grid
+    def get_cells(self, rect):
+        first_col = max(rect.left // self.cell_size, 0)
+        last_col = min((rect.right-1) // self.cell_size, self.cols-1)
+        first_row = max(rect.top // self.cell_size, 0)
+        last_row = min((rect.bottom-1) // self.cell_size, self.rows-1)
+        return slice(first_row, last_row+1), slice(first_col, last_col+1)
+
+    def occupy(self, rect):
+        self.cells[self.get_cells(rect)] += 1
+
+    def release(self, rect):
+        self.cells[self.get_cells(rect)] -= 1
+
+    def clear(self):
+        self.cells.fill(0)
+
+    def is_free(self, rect):
+        return not self.cells[self.get_cells(rect)].any()
+
+    # returns flat indices of top-left cells of all free windows (size x size cells)
+    # and number of windows in one row
+    def get_free_windows(self, size):
+        if size > self.rows or size > self.cols:
+            return np.empty(0, dtype=np.intp), 0
+        occupied = np.zeros((self.rows+1, self.cols+1), dtype=np.int32)
+        occupied[1:, 1:] = (self.cells > 0).cumsum(axis=0).cumsum(axis=1)
+        windows = (occupied[size:, size:] - occupied[:-size, size:]
+                   - occupied[size:, :-size] + occupied[:-size, :-size])
+        return np.flatnonzero(windows == 0), windows.shape[1]
+
+    # returns random center for target with given radius or None if there is no more space
+    def find_free_pos(self, radius, rng=random):
+        size = math.ceil(radius*2/self.cell_size) + 1 # +1 to leave room for random offset
+        free_windows, windows_per_row = self.get_free_windows(size)
+        if len(free_windows) == 0:
+            return None
+        window = free_windows[rng.randrange(len(free_windows))]
+        row, col = divmod(int(window), windows_per_row)
+        slack = size*self.cell_size - radius*2
+        x = col*self.cell_size + rng.randint(0, slack) + radius
+        y = row*self.cell_size + rng.randint(0, slack) + radius
+        return (x, y)
+
+
+
+# Blue noise positions for targets with given radius: every two positions are at least
+# min_distance apart and the whole screen is covered evenly (Bridson's algorithm).
+# Returns array of (x, y) centers in random order.
+def poisson_disk(width, height, radius, min_distance, rng):
+    cell_size = min_distance/math.sqrt(2) # at most one position in cell
+    cols = math.ceil(width/cell_size)
+    rows = math.ceil(height/cell_size)
+    grid = [[None]*cols for i in range(rows)]
+    positions = []
+    active = []
+
+    def add(pos):
+        grid[int(pos[1]/cell_size)][int(pos[0]/cell_size)] = pos
+        positions.append(pos)
+        active.append(pos)
+
+    def is_far(pos):
+        col, row = int(pos[0]/cell_size), int(pos[1]/cell_size)
+        for near_row in grid[max(row-2, 0):row+3]:
+            for near in near_row[max(col-2, 0):col+3]:
+                if near and (near[0]-pos[0])**2 + (near[1]-pos[1])**2 < min_distance**2:
+                    return False
+        return True
+
+    add((rng.uniform(radius, width-radius), rng.uniform(radius, height-radius)))
+    steps = 0
+    while active:
+        steps += 1
+        if steps % 4 == 0:
+            time.sleep(0) # give up GIL, so game thread isn't delayed when pool is generated in background
+        i = rng.randrange(len(active))
+        x, y = active[i]
+        for attempt in range(30):
+            angle = rng.uniform(0, 2*math.pi)
+            distance = rng.uniform(min_distance, 2*min_distance)
+            pos = (x + distance*math.cos(angle), y + distance*math.sin(angle))
+            if radius <= pos[0] <= width-radius and radius <= pos[1] <= height-radius and is_far(pos):
+                add(pos)
+                break
+        else: # no space around this position
+            active[i] = active[-1]
+            active.pop()
+    rng.shuffle(positions)
+    return np.rint(positions).astype(np.int16)
+
+# generate pool and save it for next runs, runs in pool worker
+def generate_spawn_positions(width, height, radius, min_distance, file_path):
+    rng = random.Random(f"{width}x{height}r{radius}d{min_distance}")
+    positions = poisson_disk(width, height, radius, min_distance, rng)
+    try:
+        POOLS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            np.save(f, positions)
+        os.replace(tmp_path, file_path)
+    except OSError: # pool is still used, it is generated again in next run
+        pass
+    return positions
+
+# returns pool of positions for screen size and target radius, generated once and saved as .npy file
+# (the same for every player, memory mapped when loaded). Missing pool is generated in background,
+# without waiting None is returned until it is ready.
+def get_spawn_positions(width, height, radius, min_distance=None, wait=True):
+    if min_distance is None:
+        min_distance = max(radius, MIN_POOL_DISTANCE)
+    key = (width, height, radius, min_distance)
+    if key in spawn_positions:
+        return spawn_positions[key]
+    job = pool_jobs.get(key)
+    if job is None:
+        file_path = POOLS_DIR / f"pool_{width}x{height}_r{radius}_d{min_distance}.npy"
+        try:
+            spawn_positions[key] = np.load(file_path, mmap_mode="r")
+            return spawn_positions[key]
+        except (OSError, ValueError): # not generated yet or damaged
+            job = pool_jobs[key] = pool_worker.submit(generate_spawn_positions, width, height, radius, min_distance, file_path)
+    if not wait and not job.done():
+        return None
+    spawn_positions[key] = job.result()
+    del pool_jobs[key]
+    return spawn_positions[key]
+
+
+# Draws positions from precomputed pool in order, starting at seeded cursor.
+# Positions overlapping alive targets are skipped.
+class SpawnPool():
+    def __init__(self, positions, rng=random):
+        self.positions = positions
+        self.cursor = rng.randrange(len(positions))
+
+    # returns free center for target with given radius or None if next MAX_POOL_TRIES positions are taken
+    def next_free_pos(self, spawn_grid, radius):
+        for i in range(min(MAX_POOL_TRIES, len(self.positions))):
+            x, y = self.positions[self.cursor]
+            self.cursor = (self.cursor+1) % len(self.positions)
+            if spawn_grid.is_free(pygame.Rect(int(x)-radius, int(y)-radius, radius*2, radius*2)):
+                return (int(x), int(y))
+        return None
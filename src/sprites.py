@@ -0,0 +1,90 @@
+import pygame
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from config import SETTINGS
+
+
+# Pre-rendered surfaces with LRU eviction, render method is called with key items on cache miss
+class SurfaceCache(ABC):
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.sprites = OrderedDict()
+
+    def get_cached(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.render(*key)
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.max_size:
+                self.sprites.popitem(last=False) # remove least recently used
+        else:
+            self.sprites.move_to_end(key)
+        return sprite
+
+    # returns surface for key items
+    @abstractmethod
+    def render(self, *key):
+        pass
+
+    def clear(self):
+        self.sprites.clear()
+
+
+# Target surfaces (outline + filling) keyed by quantized radius, outline margin and target colors
+class TargetSpriteCache(SurfaceCache):
+    def get(self, radius, outline_margin):
+        return self.get_cached((int(round(radius)), outline_margin, tuple(SETTINGS.Appearance.outline_color), tuple(SETTINGS.Appearance.filling_color)))
+
+    def render(self, radius, outline_margin, outline_color, filling_color):
+        radius = max(radius, 0)
+        sprite = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
+        center = (radius, radius)
+        # draw outline
+        pygame.draw.circle(sprite, outline_color, center, radius, outline_margin)
+        # draw filling
+        pygame.draw.circle(sprite, filling_color, center, radius-outline_margin)
+        if pygame.display.get_surface(): # converting requires display mode to be set
+            sprite = sprite.convert_alpha()
+        return sprite
+
+    # render every radius which target could reach to prevent stutter in first round
+    def warm(self, max_radius, outline_margin, grow=0):
+        radii = range(1, max_radius+1) if grow else [max_radius]
+        for radius in radii:
+            self.get(radius, outline_margin)
+
+
+# Text surfaces keyed by font, size, text and color
+class TextCache(SurfaceCache):
+    def __init__(self, max_size=512):
+        super().__init__(max_size)
+        self.fonts = {} # fonts used in keys by (path, size)
+        self.rects = {}
+
+    def get(self, font, text, color, size=0):
+        size = size or font.size
+        self.fonts[(font.path, size)] = font
+        return self.get_cached((font.path, size, text, tuple(color)))
+
+    def render(self, font_path, size, text, color):
+        sprite, rect = self.fonts[(font_path, size)].render(text, color, size=size)
+        return sprite
+
+    # returns rect of text like font.get_rect
+    def get_rect(self, font, text, size=0):
+        key = (font.path, size or font.size, text)
+        rect = self.rects.get(key)
+        if rect is None:
+            if len(self.rects) >= self.max_size:
+                self.rects.clear()
+            rect = self.rects[key] = font.get_rect(text, size=size)
+        return pygame.Rect(rect)
+
+    # draw text like font.render_to with top left corner of dest, returns drawn rect
+    def render_to(self, surface, dest, font, text, color, size=0):
+        sprite = self.get(font, text, color, size)
+        return surface.blit(sprite, (dest[0], dest[1]))
+
+
+target_sprites = TargetSpriteCache()
+text_cache = TextCache()
@@ -0,0 +1,181 @@
+import pygame
+import numpy as np
+from sprites import target_sprites
+
+
+# Targets stored as struct of arrays, so per frame work (growing, hit testing, deleting)
+# is done for all targets at once instead of looping over Target objects.
+# Indices of targets are valid until next remove call (deleting moves last target into freed slot).
+class TargetField():
+    def __init__(self, capacity=32):
+        self.count = 0
+        self.capacity = 0
+        self.x = np.empty(0, dtype=np.int32)
+        self.y = np.empty(0, dtype=np.int32)
+        self.radius = np.empty(0, dtype=np.float64)
+        self.previous_radius = np.empty(0, dtype=np.float64) # radius before last simulation step
+        self.max_radius = np.empty(0, dtype=np.int32)
+        self.grow_step = np.empty(0, dtype=np.float64) # radius increase per milisecond
+        self.grow = np.empty(0, dtype=np.bool_)
+        self.reached_max = np.empty(0, dtype=np.bool_)
+        self.outline_margin = np.empty(0, dtype=np.int32)
+        self.age = np.empty(0, dtype=np.float64) # miliseconds since spawn
+        self.shown_time = np.empty(0, dtype=np.float64) # time.perf_counter() of first display update, NaN before
+        self.alpha = 1.0 # position of drawn frame between previous and current simulation step
+        self.ensure_capacity(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def get_arrays(self):
+        return ["x", "y", "radius", "previous_radius", "max_radius", "grow_step", "grow", "reached_max", "outline_margin", "age", "shown_time"]
+
+    # resize arrays when there is not enough space for new targets
+    def ensure_capacity(self, capacity):
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity*2)
+        for name in self.get_arrays():
+            old_array = getattr(self, name)
+            new_array = np.zeros(capacity, dtype=old_array.dtype)
+            new_array[:self.count] = old_array[:self.count]
+            setattr(self, name, new_array)
+        self.capacity = capacity
+
+    # returns index of new target
+    def add(self, pos, grow=0, max_radius=50, duration=1.0, outline_margin=4):
+        self.ensure_capacity(self.count+1)
+        i = self.count
+        self.x[i], self.y[i] = pos
+        self.max_radius[i] = max_radius
+        self.grow_step[i] = max_radius/(duration*1000/2)
+        self.grow[i] = bool(grow)
+        self.reached_max[i] = False
+        self.radius[i] = 0 if grow else max_radius
+        self.previous_radius[i] = self.radius[i]
+        self.outline_margin[i] = outline_margin
+        self.age[i] = 0
+        self.shown_time[i] = np.nan
+        self.count += 1
+        return i
+
+    # add targets at all given positions with the same settings
+    def add_many(self, positions, grow=0, max_radius=50, duration=1.0, outline_margin=4):
+        amount = len(positions)
+        self.ensure_capacity(self.count+amount)
+        new = slice(self.count, self.count+amount)
+        if amount:
+            self.x[new], self.y[new] = np.asarray(positions).T
+        self.max_radius[new] = max_radius
+        self.grow_step[new] = max_radius/(duration*1000/2)
+        self.grow[new] = bool(grow)
+        self.reached_max[new] = False
+        self.radius[new] = self.previous_radius[new] = 0 if grow else max_radius
+        self.outline_margin[new] = outline_margin
+        self.age[new] = 0
+        self.shown_time[new] = np.nan
+        self.count += amount
+
+    # delete targets by swapping them with last ones, returns number of deleted targets
+    def remove(self, indices):
+        removed = 0
+        # descending order guarantees that moved last target is not waiting for deletion
+        for i in sorted(set(indices), reverse=True):
+            if i >= self.count:
+                continue
+            last = self.count-1
+            if i != last:
+                for name in self.get_arrays():
+                    array = getattr(self, name)
+                    array[i] = array[last]
+            self.count -= 1
+            removed += 1
+        return removed
+
+    def clear(self):
+        self.count = 0
+
+    # grow and shrink targets by one simulation step, returns indices of targets smaller than 1px
+    def update(self, delta_time=0):
+        n = self.count
+        radius = self.radius[:n]
+        self.previous_radius[:n] = radius
+        grow = self.grow[:n]
+        reached_max = self.reached_max[:n]
+        growing = grow & ~reached_max & (radius < self.max_radius[:n])
+        shrinking = grow & ~growing
+        reached_max |= shrinking
+        step = self.grow_step[:n]*delta_time
+        radius += np.where(growing, step, 0) - np.where(shrinking, step, 0)
+        self.age[:n] += delta_time
+        return np.flatnonzero(shrinking & (radius <= 0)).tolist()
+
+    # radii interpolated between simulation steps, the same as drawn on screen
+    def get_radii(self):
+        n = self.count
+        previous_radius = self.previous_radius[:n]
+        return previous_radius + (self.radius[:n] - previous_radius)*self.alpha
+
+    # returns index of target under given point or None
+    def hit_test(self, point):
+        n = self.count
+        dx = self.x[:n] - point[0]
+        dy = self.y[:n] - point[1]
+        hits = np.flatnonzero(dx*dx + dy*dy <= self.get_radii()**2)
+        if len(hits) == 0:
+            return None
+        return int(hits[0])
+
+    # returns index of target with center closest to given point or None if there are no targets
+    def nearest(self, point):
+        n = self.count
+        if n == 0:
+            return None
+        dx = self.x[:n] - point[0]
+        dy = self.y[:n] - point[1]
+        return int(np.argmin(dx*dx + dy*dy))
+
+    # draw all targets with one blits call, returns touched rects
+    def draw(self, screen, alpha=1.0):
+        n = self.count
+        self.alpha = alpha
+        radii = np.maximum(np.rint(self.get_radii()), 0).astype(np.int32)
+        blit_sequence = []
+        for x, y, radius, outline_margin in zip(self.x[:n].tolist(), self.y[:n].tolist(), radii.tolist(), self.outline_margin[:n].tolist()):
+            sprite = target_sprites.get(radius, outline_margin)
+            blit_sequence.append((sprite, (x-radius, y-radius)))
+        return screen.blits(blit_sequence)
+
+    # set shown time of targets which weren't displayed yet
+    def mark_shown(self, update_time):
+        shown_time = self.shown_time[:self.count]
+        shown_time[np.isnan(shown_time)] = update_time
+
+    # returns None if target wasn't displayed yet
+    def get_shown_time(self, i):
+        shown_time = float(self.shown_time[i])
+        if shown_time != shown_time: # NaN
+            return None
+        return shown_time
+
+    # radius shown on screen
+    def get_radius(self, i):
+        previous_radius = float(self.previous_radius[i])
+        return previous_radius + (float(self.radius[i]) - previous_radius)*self.alpha
+
+    def get_pos(self, i):
+        return (int(self.x[i]), int(self.y[i]))
+
+    # get max occupied space of target as rect
+    def get_final_rect(self, i):
+        max_radius = int(self.max_radius[i])
+        rect = pygame.Rect((0, 0), (max_radius*2, max_radius*2))
+        rect.center = self.get_pos(i)
+        return rect
+
+    # returns indices of targets which max occupied space collides with rect
+    def get_colliding(self, rect):
+        n = self.count
+        x, y, max_radius = self.x[:n], self.y[:n], self.max_radius[:n]
+        colliding = (x - max_radius < rect.right) & (x + max_radius > rect.left) & (y - max_radius < rect.bottom) & (y + max_radius > rect.top)
+        return np.flatnonzero(colliding).tolist()
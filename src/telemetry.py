@@ -0,0 +1,89 @@
+import time
+import numpy as np
+from config import SETTINGS
+
+# columns of shot and their types, target columns are -1 if there was no target on screen
+COLUMNS = {
+    "time": np.float64, # seconds since start of round
+    "x": np.int16, # cursor position
+    "y": np.int16,
+    "target_x": np.int16, # hit target or nearest target center
+    "target_y": np.int16,
+    "target_radius": np.float32, # radius shown on screen
+    "hit": np.bool_,
+    "target_age": np.float32, # miliseconds since target spawn
+}
+
+
+# Every shot of round written into preallocated column arrays. Arrays work as ring buffer,
+# so memory is bounded and only the newest capacity shots are kept in long rounds.
+class ShotTelemetry():
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.columns = None # allocated on first round
+        self.count = 0 # all shots of round, including overwritten ones
+        self.game_mode = None
+        self.start_time = 0
+
+    def is_recording(self):
+        return self.game_mode is not None
+
+    def start(self, game_mode, start_time):
+        if self.columns is None:
+            self.columns = {name: np.empty(self.capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.game_mode = game_mode
+        self.start_time = start_time
+        self.count = 0
+
+    def record(self, shot_time, pos, target_pos, target_radius, hit, target_age):
+        if self.game_mode is None:
+            return
+        i = self.count % self.capacity
+        columns = self.columns
+        columns["time"][i] = shot_time - self.start_time
+        columns["x"][i], columns["y"][i] = pos
+        columns["target_x"][i], columns["target_y"][i] = target_pos
+        columns["target_radius"][i] = target_radius
+        columns["hit"][i] = hit
+        columns["target_age"][i] = target_age
+        self.count += 1
+
+    # returns kept shots as columns in order of shooting
+    def get_columns(self):
+        if self.columns is None:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        if self.count <= self.capacity:
+            return {name: column[:self.count].copy() for name, column in self.columns.items()}
+        oldest = self.count % self.capacity
+        return {name: np.concatenate((column[oldest:], column[:oldest])) for name, column in self.columns.items()}
+
+    def get_dropped(self):
+        return max(self.count - self.capacity, 0)
+
+    # ends round, returns path of written file or None if there were no shots or saving is disabled
+    def stop(self, file_path=None):
+        if self.game_mode is None:
+            return None
+        game_mode = self.game_mode
+        self.game_mode = None
+        if self.count == 0 or not SETTINGS.SAVE_TELEMETRY:
+            return None
+        if file_path is None:
+            SETTINGS.TELEMETRY_DIR.mkdir(parents=True, exist_ok=True)
+            file_name = f"{game_mode.replace(' ', '_')}_{int(time.time()*1000)}.{SETTINGS.TELEMETRY_FORMAT}"
+            file_path = SETTINGS.TELEMETRY_DIR / file_name
+        if str(file_path).endswith(".csv"):
+            export_csv(file_path, self.get_columns())
+        else:
+            np.savez_compressed(file_path, game_mode=game_mode, dropped=self.get_dropped(), **self.get_columns())
+        return file_path
+
+
+def export_csv(file_path, columns):
+    names = list(columns)
+    formats = ["%.6f" if columns[name].dtype.kind == "f" else "%d" for name in names]
+    np.savetxt(file_path, np.column_stack([columns[name].astype(np.float64) for name in names]),
+               fmt=formats, delimiter=",", header=",".join(names), comments="")
+
+
+shot_telemetry = ShotTelemetry()
@@ -0,0 +1,21 @@
+import os
+import sys
+import pathlib
+import pytest
+
+# game modules import each other by name from src
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+# builds TDigest from given values
+@pytest.fixture
+def make_digest():
+    from sketches import TDigest
+    def make(values):
+        digest = TDigest()
+        for value in values:
+            digest.add(value)
+        return digest
+    return make
@@ -0,0 +1,38 @@
+import math
+from components import downsample, prepare_graph_data, GraphCache
+
+
+def test_downsample_keeps_ends_and_order():
+    values = [math.sin(i/50) for i in range(10000)]
+    sampled = downsample(values, 300)
+    assert len(sampled) == 300
+    assert sampled[0] == 0 and sampled[-1] == len(values)-1
+    assert sampled == sorted(set(sampled))
+
+def test_downsample_keeps_spikes():
+    values = [0.0]*5000
+    values[1234] = 10.0
+    values[4321] = -10.0
+    sampled = downsample(values, 100)
+    assert 1234 in sampled and 4321 in sampled
+
+def test_downsample_short_data():
+    assert downsample([1, 2, 3], 100) == [0, 1, 2]
+    assert downsample([1, 2, 3, 4], 2) == [0, 1, 2, 3]
+
+def test_prepare_graph_data_sorts_by_time():
+    data, sampled = prepare_graph_data([(3, 30), (1, 10), (2, 20)], 100)
+    assert data == [(1, 10), (2, 20), (3, 30)]
+    assert sampled == [0, 1, 2]
+
+def test_graph_cache_revisions_and_size():
+    cache = GraphCache(max_size=2)
+    cache.set("AWP Hits", 1, "graph 1")
+    assert cache.get("AWP Hits", 1) == "graph 1"
+    assert cache.get("AWP Hits", 2) is None # results added since rendering
+    cache.set("AWP Hits", 2, "graph 2")
+    cache.set("AWP Accuracy", 1, "graph 3")
+    cache.set("Arcade Hits", 1, "graph 4") # oldest graph is removed
+    assert cache.get("AWP Hits", 2) is None
+    assert cache.get("AWP Accuracy", 1) == "graph 3"
+    assert cache.get("Arcade Hits", 1) == "graph 4"
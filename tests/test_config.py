@@ -0,0 +1,65 @@
+import os
+import json
+import history
+from config import SettingsStore
+
+
+def test_set_flush_and_load(tmp_path):
+    file_path = tmp_path / "pyaimbooster.settings"
+    store = SettingsStore(file_path)
+    assert store.get("AWPSettings") == {}
+    store.set("AWPSettings", {"max_radius": 30})
+    store.set("DisplaySettings", {"fullscreen": True})
+    assert not file_path.exists() # kept in memory until flush
+    store.flush()
+    assert SettingsStore(file_path).get("AWPSettings") == {"max_radius": 30}
+    assert SettingsStore(file_path).get("DisplaySettings") == {"fullscreen": True}
+
+def test_flush_only_when_changed(tmp_path):
+    file_path = tmp_path / "pyaimbooster.settings"
+    store = SettingsStore(file_path)
+    store.flush()
+    assert not file_path.exists()
+    store.set("AWPSettings", {"max_radius": 30})
+    store.flush()
+    file_path.unlink()
+    store.flush()
+    assert not file_path.exists()
+
+def test_flush_if_idle(tmp_path):
+    file_path = tmp_path / "pyaimbooster.settings"
+    store = SettingsStore(file_path, flush_delay=60)
+    store.set("AWPSettings", {"max_radius": 30})
+    store.flush_if_idle()
+    assert not file_path.exists()
+    store.last_change -= 61
+    store.flush_if_idle()
+    assert file_path.exists()
+
+def test_invalid_lines_are_skipped(tmp_path):
+    file_path = tmp_path / "pyaimbooster.settings"
+    file_path.write_text('AWPSettings {"max_radius": 30}\nbroken\nArcadeSettings {"grow"\n')
+    store = SettingsStore(file_path)
+    assert store.get("AWPSettings") == {"max_radius": 30}
+    assert store.get("ArcadeSettings") == {}
+
+def test_flush_during_history_compaction(tmp_path, monkeypatch):
+    # both files are in home directory and have same stem
+    monkeypatch.setattr(history, "HISTORY_PATH", tmp_path / "pyaimbooster.history")
+    store = SettingsStore(tmp_path / "pyaimbooster.settings")
+    store.set("DisplaySettings", {"fullscreen": True})
+    fsync = os.fsync
+    flushed = []
+    # settings are flushed by main thread while history worker writes its temporary file
+    def fsync_and_flush(fd):
+        fsync(fd)
+        if not flushed:
+            flushed.append(True)
+            store.flush()
+    monkeypatch.setattr(os, "fsync", fsync_and_flush)
+    history.compact_history({"AWP": {"1700000000": {"Hits": 10}}}, {})
+    assert flushed
+    assert SettingsStore(store.file_path).get("DisplaySettings") == {"fullscreen": True}
+    records = [json.loads(line) for line in history.HISTORY_PATH.read_text().splitlines()]
+    assert [(record["mode"], record["results"]["Hits"]) for record in records] == [("AWP", 10)]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["pyaimbooster.history", "pyaimbooster.settings"]
@@ -0,0 +1,86 @@
+import gc
+import json
+import pytest
+import history
+from sketches import TDigest
+
+STATS = {"Hits": 10, "Accuracy": 50.0, "Median response": 0.4, "Median spawn response": 0.5}
+
+
+def forget_history():
+    for state in (history.results, history.columns, history.revisions, history.round_sketches, history.sketches):
+        state.clear()
+    history.loaded = False
+
+@pytest.fixture(autouse=True)
+def history_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_PATH", tmp_path / "pyaimbooster.history")
+    monkeypatch.setattr(history, "OLD_HISTORY_PATH", tmp_path / "pyaimbooster.stats")
+    forget_history()
+    yield history.HISTORY_PATH
+    forget_history()
+
+def add_round(gamemode, stats, new_sketches=None):
+    history.add_results(gamemode, stats, new_sketches).result() # wait for worker
+
+
+def test_add_and_load(history_file, make_digest):
+    add_round("AWP", STATS, {"Response": make_digest([0.3, 0.4, 0.5])})
+    add_round("AWP", dict(STATS, Hits=20))
+    add_round("Arcade", STATS)
+    assert len(history_file.read_text().splitlines()) == 3
+    forget_history()
+    assert [value for date, value in history.get_selected_results("AWP", "Hits")] == [10, 20]
+    assert history.get_aggregates("AWP", "Hits")["Best"] == 20
+    assert history.get_result_types("Arcade") == list(STATS)
+    assert history.get_percentiles("AWP", "Response")["p50"] == pytest.approx(0.4)
+
+def test_same_second_rounds_are_kept(history_file, monkeypatch):
+    monkeypatch.setattr(history.time, "time", lambda: 1700000000.5)
+    add_round("AWP", STATS)
+    add_round("AWP", dict(STATS, Hits=20))
+    add_round("AWP", dict(STATS, Hits=30))
+    dates = list(history.results["AWP"])
+    assert len(set(dates)) == 3
+    assert len(history.get_column("AWP", "Hits")) == 3
+    history.compact_history()
+    forget_history()
+    assert [value for date, value in history.get_selected_results("AWP", "Hits")] == [10, 20, 30]
+
+def test_compact_keeps_rounds(history_file, make_digest):
+    add_round("AWP", STATS, {"Response": make_digest([0.2, 0.3])})
+    add_round("Arcade", STATS)
+    history.compact_history()
+    forget_history()
+    assert len(history.get_selected_results("AWP", "Hits")) == 1
+    assert len(history.get_selected_results("Arcade", "Hits")) == 1
+    assert history.get_percentiles("AWP", "Response")["p50"] == pytest.approx(0.25)
+
+def test_damaged_line_is_dropped(history_file):
+    add_round("AWP", STATS)
+    with history_file.open("a", encoding="utf-8") as f:
+        f.write('{"mode": "AWP", "date": "17') # written partially before crash
+    forget_history()
+    assert len(history.get_selected_results("AWP", "Hits")) == 1
+    # log is rewritten without damaged line
+    assert all(json.loads(line) for line in history_file.read_text().splitlines())
+
+def test_migrate_old_history(history_file):
+    old_history = {"AWP": {"1600000001": STATS, "1600000000": dict(STATS, Hits=5)}}
+    history.OLD_HISTORY_PATH.write_text(json.dumps(old_history))
+    assert [value for date, value in history.get_selected_results("AWP", "Hits")] == [5, 10]
+
+def test_round_without_hits_is_valid_json(history_file):
+    add_round("AWP", STATS, {"Response": TDigest()})
+    for line in history_file.read_text().splitlines():
+        json.loads(line, parse_constant=pytest.fail)
+
+def test_loaded_sketches_are_not_tracked_by_gc(history_file, make_digest):
+    add_round("AWP", STATS, {"Response": make_digest([0.2, 0.3, 0.4])})
+    forget_history()
+    history.load_history()
+    gc.collect()
+    round_sketches, = history.round_sketches["AWP"].values()
+    centroids = round_sketches["Response"]["centroids"]
+    assert not any(gc.is_tracked(centroid) for centroid in centroids)
+    assert history.get_percentiles("AWP", "Response")["p50"] == pytest.approx(0.3)
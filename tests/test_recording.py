@@ -0,0 +1,59 @@
+import pytest
+import recording
+from config import SETTINGS
+from recording import SessionRecorder, write_session, read_session, apply_settings, restore_settings
+
+
+def test_session_round_trip(tmp_path):
+    recorder = SessionRecorder()
+    recorder.next_seed = 1234
+    seed = recorder.start("AWP", SETTINGS.AWP, 10.0)
+    assert seed == 1234
+    recorder.record_time(recording.PUMP, 10.25)
+    recorder.record(recording.CLICK, x=120, y=-5)
+    recorder.record(recording.SPAWN, x=400, y=300)
+    recorder.record(recording.FRAME, 6.944)
+    header, records = recorder.discard()
+    assert not recorder.is_recording()
+    file_path = tmp_path / "session.pab"
+    write_session(file_path, header, records)
+    read_header, read_records = read_session(file_path)
+    assert read_header == header
+    assert read_header["settings"]["AWPSettings"] == vars(SETTINGS.AWP)
+    assert read_records == [
+        (recording.PUMP, 0.25, 0, 0),
+        (recording.CLICK, 0.0, 120, -5),
+        (recording.SPAWN, 0.0, 400, 300),
+        (recording.FRAME, 6.944, 0, 0),
+    ]
+    assert recording.get_spawns(read_records) == [(400, 300)]
+
+def test_not_session_file(tmp_path):
+    file_path = tmp_path / "other.pab"
+    file_path.write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        read_session(file_path)
+
+def test_records_are_ignored_when_not_recording():
+    recorder = SessionRecorder()
+    recorder.record(recording.CLICK, x=1, y=2)
+    assert recorder.stop() is None
+
+def test_apply_and_restore_settings():
+    previous_radius = SETTINGS.AWP.max_radius
+    previous_time = SETTINGS.CHALLENGE_TIME
+    previous_settings = apply_settings({"CHALLENGE_TIME": 1234, "AWPSettings": {"max_radius": 77}})
+    assert SETTINGS.CHALLENGE_TIME == 1234
+    assert SETTINGS.AWP.max_radius == 77
+    restore_settings(previous_settings)
+    assert SETTINGS.CHALLENGE_TIME == previous_time
+    assert SETTINGS.AWP.max_radius == previous_radius
+
+def test_spawn_pool_use_is_recorded():
+    recorder = SessionRecorder()
+    recorder.start("AWP", SETTINGS.AWP, 0.0, spawn_pool=False)
+    header, records = recorder.discard()
+    assert header["spawn_pool"] is False
+    recorder.next_spawn_pool = True
+    recorder.start("AWP", SETTINGS.AWP, 0.0)
+    assert recorder.next_spawn_pool is None # used only by one session
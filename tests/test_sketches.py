@@ -0,0 +1,74 @@
+import json
+import random
+import numpy as np
+import pytest
+from sketches import TDigest, digest_from_dict
+
+
+# difference between rank of estimated quantile and requested one
+def rank_error(values, estimate, q):
+    return abs(np.searchsorted(np.sort(values), estimate)/len(values) - q)
+
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.5, 0.9, 0.99])
+def test_quantile_accuracy(q, make_digest):
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-1, 0.5) for i in range(20000)]
+    digest = make_digest(values)
+    assert rank_error(values, digest.quantile(q), q) < 0.01
+
+def test_mean_variance_min_max(make_digest):
+    rng = random.Random(2)
+    values = [rng.gauss(0.3, 0.05) for i in range(5000)]
+    digest = make_digest(values)
+    assert digest.mean == pytest.approx(np.mean(values))
+    assert digest.get_variance() == pytest.approx(np.var(values))
+    assert digest.min == min(values)
+    assert digest.max == max(values)
+    assert len(digest) == len(values)
+
+def test_merge_matches_one_digest(make_digest):
+    rng = random.Random(3)
+    rounds = [[rng.uniform(0.1, 1.0) for i in range(rng.randrange(1, 300))] for j in range(200)]
+    merged = TDigest()
+    for values in rounds:
+        merged.merge(make_digest(values))
+    all_values = [value for values in rounds for value in values]
+    assert merged.count == len(all_values)
+    assert merged.mean == pytest.approx(np.mean(all_values))
+    assert merged.get_variance() == pytest.approx(np.var(all_values))
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert rank_error(all_values, merged.quantile(q), q) < 0.01
+
+def test_merge_empty(make_digest):
+    digest = make_digest([1.0, 2.0, 3.0])
+    digest.merge(TDigest())
+    assert digest.count == 3
+    assert digest.quantile(0.5) == pytest.approx(2.0)
+
+def test_empty_digest():
+    digest = TDigest()
+    assert digest.quantile(0.5) == 0
+    assert digest.get_variance() == 0
+    # infinite min and max can't be written to history
+    data = json.loads(json.dumps(digest.to_dict(), allow_nan=False))
+    restored = digest_from_dict(data)
+    assert restored.count == 0
+    assert restored.quantile(0.9) == 0
+
+def test_dict_round_trip(make_digest):
+    rng = random.Random(4)
+    digest = make_digest([rng.expovariate(3) for i in range(3000)])
+    restored = digest_from_dict(json.loads(json.dumps(digest.to_dict(), allow_nan=False)))
+    assert restored.count == digest.count
+    assert restored.min == digest.min
+    assert restored.max == digest.max
+    assert restored.mean == pytest.approx(digest.mean)
+    for q in (0.5, 0.9, 0.99):
+        assert restored.quantile(q) == pytest.approx(digest.quantile(q), rel=1e-4)
+
+def test_single_value(make_digest):
+    digest = make_digest([0.25])
+    assert digest.quantile(0) == 0.25
+    assert digest.quantile(0.5) == 0.25
+    assert digest.quantile(1) == 0.25
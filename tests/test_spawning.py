@@ -0,0 +1,91 @@
+import math
+import random
+import threading
+import numpy as np
+import pygame
+import spawning
+from spawning import SpawnGrid, SpawnPool, poisson_disk, get_spawn_positions, generate_spawn_positions
+
+
+def target_rect(pos, radius):
+    return pygame.Rect(pos[0]-radius, pos[1]-radius, radius*2, radius*2)
+
+
+def test_grid_finds_only_free_space():
+    grid = SpawnGrid(800, 600)
+    rng = random.Random(1)
+    rects = []
+    while True:
+        pos = grid.find_free_pos(30, rng)
+        if pos is None:
+            break
+        rect = target_rect(pos, 30)
+        assert grid.get_cells(rect) and grid.is_free(rect)
+        assert pygame.Rect(0, 0, 800, 600).contains(rect)
+        assert rect.collidelist(rects) == -1
+        grid.occupy(rect)
+        rects.append(rect)
+    assert len(rects) > 20
+
+def test_grid_release():
+    grid = SpawnGrid(100, 100)
+    rect = pygame.Rect(20, 20, 30, 30)
+    grid.occupy(rect)
+    grid.occupy(rect)
+    grid.release(rect)
+    assert not grid.is_free(rect)
+    grid.release(rect)
+    assert grid.is_free(rect)
+    grid.occupy(rect)
+    grid.clear()
+    assert grid.is_free(rect)
+
+def test_grid_without_space():
+    assert SpawnGrid(40, 40).find_free_pos(50) is None
+
+def test_poisson_disk_distance_and_bounds():
+    radius, min_distance = 5, 12
+    positions = poisson_disk(300, 200, radius, min_distance, random.Random(2)).astype(np.int64)
+    assert len(positions) > 200
+    assert positions[:, 0].min() >= radius and positions[:, 0].max() <= 300-radius
+    assert positions[:, 1].min() >= radius and positions[:, 1].max() <= 200-radius
+    dx = positions[:, 0, None] - positions[None, :, 0]
+    dy = positions[:, 1, None] - positions[None, :, 1]
+    distances = np.sqrt(dx*dx + dy*dy) + np.eye(len(positions))*min_distance
+    assert distances.min() >= min_distance - math.sqrt(2) # positions are rounded to pixels
+
+def test_spawn_positions_are_saved_and_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(spawning, "POOLS_DIR", tmp_path)
+    monkeypatch.setattr(spawning, "spawn_positions", {})
+    positions = get_spawn_positions(200, 100, 4)
+    assert [path.name for path in tmp_path.iterdir()] == ["pool_200x100_r4_d10.npy"]
+    monkeypatch.setattr(spawning, "spawn_positions", {})
+    assert np.array_equal(get_spawn_positions(200, 100, 4, wait=False), positions) # from file
+
+def test_spawn_positions_are_generated_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(spawning, "POOLS_DIR", tmp_path)
+    monkeypatch.setattr(spawning, "spawn_positions", {})
+    generating = threading.Event()
+    def generate_later(*args):
+        generating.wait()
+        return generate_spawn_positions(*args)
+    monkeypatch.setattr(spawning, "generate_spawn_positions", generate_later)
+    assert get_spawn_positions(200, 100, 4, wait=False) is None
+    assert get_spawn_positions(200, 100, 4, wait=False) is None # the same job
+    generating.set()
+    positions = get_spawn_positions(200, 100, 4)
+    assert len(positions) > 0
+    assert get_spawn_positions(200, 100, 4, wait=False) is positions
+    assert not spawning.pool_jobs
+
+def test_pool_skips_occupied_positions():
+    positions = np.array([[20, 20], [60, 20], [100, 20]], dtype=np.int16)
+    grid = SpawnGrid(200, 100)
+    pool = SpawnPool(positions, random.Random(3))
+    taken = []
+    for i in range(3):
+        pos = pool.next_free_pos(grid, 10)
+        grid.occupy(target_rect(pos, 10))
+        taken.append(pos)
+    assert sorted(taken) == [(20, 20), (60, 20), (100, 20)]
+    assert pool.next_free_pos(grid, 10) is None
@@ -0,0 +1,55 @@
+import pytest
+import pygame
+from targetfield import TargetField
+
+
+def test_add_hit_test_and_remove():
+    targets = TargetField(capacity=2)
+    for i in range(5): # grows over capacity
+        targets.add((100*i + 50, 50), max_radius=20)
+    assert len(targets) == 5
+    assert targets.hit_test((250, 60)) == 2
+    assert targets.hit_test((250, 75)) is None
+    assert targets.remove([0, 2, 2, 10]) == 2
+    assert len(targets) == 3
+    assert sorted(targets.get_pos(i) for i in range(3)) == [(150, 50), (350, 50), (450, 50)]
+
+def test_growing_target_is_hit_only_inside_current_radius():
+    targets = TargetField()
+    targets.add((100, 100), grow=1, max_radius=50, duration=1.0)
+    assert targets.hit_test((101, 100)) is None # radius 0 at spawn
+    targets.update(250) # half of growing time
+    assert targets.get_radius(0) == pytest.approx(25)
+    assert targets.hit_test((120, 100)) == 0
+    assert targets.hit_test((130, 100)) is None
+
+def test_growing_target_disappears():
+    targets = TargetField()
+    targets.add((100, 100), grow=1, max_radius=50, duration=1.0)
+    steps = 0
+    while not targets.update(10):
+        steps += 1
+    assert steps*10 == pytest.approx(1000, abs=20) # grows and shrinks in duration
+
+def test_nearest():
+    targets = TargetField()
+    assert targets.nearest((0, 0)) is None
+    targets.add_many([(10, 10), (200, 200), (50, 40)], max_radius=5)
+    assert targets.nearest((60, 60)) == 2
+    assert targets.nearest((190, 180)) == 1
+
+def test_shown_time():
+    targets = TargetField()
+    targets.add((10, 10))
+    assert targets.get_shown_time(0) is None
+    targets.mark_shown(1.5)
+    targets.add((30, 30))
+    targets.mark_shown(2.5)
+    assert targets.get_shown_time(0) == 1.5
+    assert targets.get_shown_time(1) == 2.5
+
+def test_colliding_targets():
+    targets = TargetField()
+    targets.add_many([(10, 10), (17, 10), (30, 10), (17, 17)], max_radius=4)
+    assert targets.get_colliding(targets.get_final_rect(0)) == [0, 1, 3]
+    assert targets.get_colliding(pygame.Rect(40, 40, 5, 5)) == []
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from config import SETTINGS
+from telemetry import ShotTelemetry, COLUMNS
+
+
+def record_shots(telemetry, amount):
+    for i in range(amount):
+        telemetry.record(10.0 + i, (i, 2*i), (100, 200), 25.5, i % 2 == 0, 300.0)
+
+
+@pytest.fixture
+def save_telemetry(monkeypatch):
+    monkeypatch.setattr(SETTINGS, "SAVE_TELEMETRY", True)
+
+def test_columns_in_shooting_order():
+    telemetry = ShotTelemetry(capacity=4)
+    telemetry.start("AWP", 10.0)
+    record_shots(telemetry, 6)
+    columns = telemetry.get_columns()
+    assert list(columns["time"]) == [2.0, 3.0, 4.0, 5.0] # oldest shots are overwritten
+    assert list(columns["y"]) == [4, 6, 8, 10]
+    assert telemetry.get_dropped() == 2
+
+def test_not_recording():
+    telemetry = ShotTelemetry()
+    telemetry.record(1.0, (1, 2), (-1, -1), 0, False, 0)
+    assert all(len(column) == 0 for column in telemetry.get_columns().values())
+    assert telemetry.stop() is None
+
+def test_round_without_shots_is_not_saved(tmp_path, save_telemetry):
+    telemetry = ShotTelemetry()
+    telemetry.start("AWP", 0.0)
+    assert telemetry.stop(tmp_path / "shots.npz") is None
+    assert not list(tmp_path.iterdir())
+
+def test_export_npz(tmp_path, save_telemetry):
+    telemetry = ShotTelemetry(capacity=4)
+    telemetry.start("Arcade", 10.0)
+    record_shots(telemetry, 5)
+    file_path = telemetry.stop(tmp_path / "shots.npz")
+    with np.load(file_path) as shots:
+        assert str(shots["game_mode"]) == "Arcade"
+        assert int(shots["dropped"]) == 1
+        for name, dtype in COLUMNS.items():
+            assert shots[name].dtype == dtype
+        assert list(shots["hit"]) == [False, True, False, True]
+
+def test_export_csv(tmp_path, save_telemetry):
+    telemetry = ShotTelemetry()
+    telemetry.start("AWP", 10.0)
+    record_shots(telemetry, 3)
+    file_path = telemetry.stop(tmp_path / "shots.csv")
+    lines = file_path.read_text().splitlines()
+    assert lines[0] == ",".join(COLUMNS)
+    assert lines[2] == "1.000000,1,2,100,200,25.500000,0,300.000000"
+    assert len(lines) == 4